@@ -4,10 +4,18 @@
 
 from __future__ import annotations
 
+import time
 from importlib import metadata
 
+IMPORT_STARTED = time.perf_counter()
+"""Value of :func:`time.perf_counter` when the package was imported.
+
+This is set before any of the application's dependencies are imported,
+so that their import time is included in the ``imports`` startup phase.
+"""
+
 try:
     __version__ = metadata.version("capella_model_explorer")
 except metadata.PackageNotFoundError:  # pragma: no cover
     __version__ = "0.0.0+unknown"
-del metadata
+del metadata, time
@@ -4,14 +4,18 @@
 
 from __future__ import annotations
 
+import collections
 import importlib
 import json
 import logging
+import logging.config
+import math
 import os
 import pathlib
 import shlex
 import shutil
 import subprocess
+import tempfile
 import time
 import typing as t
 
@@ -20,7 +24,6 @@ import uvicorn
 
 import capella_model_explorer
 import capella_model_explorer.constants as c
-from capella_model_explorer import app
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +44,25 @@ def run_container(*, log_config: dict[str, t.Any]) -> None:
         "-it",
         "--name=cme",
         f"-eCME_LIVE_MODE={'1' if c.LIVE_MODE else '0'}",
+        f"-eCME_MODEL_SNAPSHOT={'1' if c.MODEL_SNAPSHOT else '0'}",
+        f"-eCME_LAZY_INSTANCES={'1' if c.LAZY_INSTANCES else '0'}",
+        f"-eCME_TEMPLATE_WORKERS={c.TEMPLATE_WORKERS}",
+        f"-eCME_WORKERS={c.WORKERS}",
+        f"-eCME_REPORT_THREADS={c.REPORT_THREADS}",
+        f"-eCME_DIAGRAM_THREADS={c.DIAGRAM_THREADS}",
+        f"-eCME_DIAGRAM_STREAM={'1' if c.DIAGRAM_STREAM else '0'}",
+        f"-eCME_RENDER_PROCESSES={c.RENDER_PROCESSES}",
+        f"-eCME_RENDER_TIMEOUT={c.RENDER_TIMEOUT}",
+        f"-eCME_SLOW_RENDER_THRESHOLD={c.SLOW_RENDER_THRESHOLD}",
+        f"-eCME_STREAM_DOCUMENTS={'1' if c.STREAM_DOCUMENTS else '0'}",
+        f"-eCME_WARMUP={'1' if c.WARMUP else '0'}",
+        f"-eCME_WARMUP_BUDGET={c.WARMUP_BUDGET}",
+        f"-eCME_WARMUP_TEMPLATES={','.join(sorted(c.WARMUP_TEMPLATES))}",
+        f"-eCME_RENDER_CACHE_SIZE={c.RENDER_CACHE_SIZE}",
+        f"-eCME_RENDER_CACHE_DISK={'1' if c.RENDER_CACHE_DISK else '0'}",
+        f"-eCME_DIAGRAM_CACHE_SIZE={c.DIAGRAM_CACHE_SIZE}",
+        f"-eCME_DIAGRAM_MEMORY_CACHE_SIZE={c.DIAGRAM_MEMORY_CACHE_SIZE}",
+        f"-eCME_LAYOUT_MEMORY_CACHE_SIZE={c.LAYOUT_MEMORY_CACHE_SIZE}",
         f"-eCME_PORT={c.PORT}",
         f"-eCME_ROUTE_PREFIX={c.ROUTE_PREFIX}",
         f"-eCME_LOG_CONFIG={json.dumps(log_config)}",
@@ -71,6 +93,22 @@ def run_local(*, rebuild: bool, log_config: dict[str, t.Any]) -> None:
     if rebuild or not pathlib.Path(c.css_bundle_path).exists():
         build_bundle(watch=False)
 
+    # Render processes must be forked before the server starts threads,
+    # so the model has to be loaded before that too
+    if c.WORKERS > 1 or c.RENDER_PROCESSES:
+        logger.info(
+            "Running the application locally with %d workers...", c.WORKERS
+        )
+        # Must be set before prometheus_client is imported for the first time
+        if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+            os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(
+                prefix="cme-metrics-"
+            )
+        from capella_model_explorer import prefork  # noqa: PLC0415
+
+        prefork.serve(workers=c.WORKERS, log_config=log_config)
+        return
+
     logger.info("Running the application locally...")
     uvicorn.run(
         app="capella_model_explorer.app:app",
@@ -325,6 +363,25 @@ def main(
     show_default=True,
     help="The Capella model to load (file, URL or JSON string).",
 )
+@click.option(
+    "--model-snapshot/--no-model-snapshot",
+    envvar="CME_MODEL_SNAPSHOT",
+    default=c.Defaults.model_snapshot,
+    show_default=True,
+    help=(
+        "Keep on-disk snapshots of the model's element index in the cache"
+        " directory, and of the model files for Git-backed models, and"
+        " load from them if the model did not change. Only the most"
+        " recently used snapshots are kept."
+    ),
+)
+@click.option(
+    "--cache-dir",
+    envvar="CME_CACHE_DIR",
+    default=str(c.Defaults.cache_dir),
+    show_default=True,
+    help="The directory to store persistent caches in.",
+)
 @click.option(
     "-t",
     "--templates-dir",
@@ -343,13 +400,194 @@ def main(
         " Ignored in '--dev' mode, where it is always enabled."
     ),
 )
+@click.option(
+    "--lazy-instances/--eager-instances",
+    envvar="CME_LAZY_INSTANCES",
+    default=c.Defaults.lazy_instances,
+    show_default=True,
+    help=(
+        "Find the model elements for each template on first use,"
+        " instead of for all templates during startup."
+    ),
+)
+@click.option(
+    "--template-workers",
+    envvar="CME_TEMPLATE_WORKERS",
+    type=click.IntRange(min=0),
+    default=c.Defaults.template_workers,
+    show_default=True,
+    help=(
+        "Number of worker processes used to find the model elements"
+        " for all templates during startup. 0 uses one per CPU core."
+        " If the model is loaded while the server is already running,"
+        " which is the case with a single worker, each of them loads the"
+        " model from its snapshot, so they are only used with snapshots."
+    ),
+)
+@click.option(
+    "--render-cache-size",
+    envvar="CME_RENDER_CACHE_SIZE",
+    type=click.IntRange(min=0),
+    default=c.Defaults.render_cache_size,
+    show_default=True,
+    help="Size of the in-memory cache for rendered reports in MiB.",
+)
+@click.option(
+    "--render-cache-disk/--no-render-cache-disk",
+    envvar="CME_RENDER_CACHE_DISK",
+    default=c.Defaults.render_cache_disk,
+    show_default=True,
+    help=(
+        "Also keep rendered reports in the cache directory, so that they"
+        " survive restarts."
+    ),
+)
+@click.option(
+    "--diagram-cache-size",
+    envvar="CME_DIAGRAM_CACHE_SIZE",
+    type=click.IntRange(min=0),
+    default=c.Defaults.diagram_cache_size,
+    show_default=True,
+    help=(
+        "Size of the caches for rendered diagrams and for diagram layouts"
+        " in the cache directory, in MiB each. The least recently used"
+        " entries are deleted when they are full. 0 disables them."
+    ),
+)
+@click.option(
+    "--diagram-memory-cache-size",
+    envvar="CME_DIAGRAM_MEMORY_CACHE_SIZE",
+    type=click.IntRange(min=0),
+    default=c.Defaults.diagram_memory_cache_size,
+    show_default=True,
+    help="Size of the in-memory cache for rendered diagrams in MiB.",
+)
+@click.option(
+    "--layout-memory-cache-size",
+    envvar="CME_LAYOUT_MEMORY_CACHE_SIZE",
+    type=click.IntRange(min=0),
+    default=c.Defaults.layout_memory_cache_size,
+    show_default=True,
+    help="Size of the in-memory cache for diagram layouts in MiB.",
+)
+@click.option(
+    "--warmup/--no-warmup",
+    envvar="CME_WARMUP",
+    default=c.Defaults.warmup,
+    show_default=True,
+    help=(
+        "Render reports in the background after startup, so that they are"
+        " already cached when first requested."
+    ),
+)
+@click.option(
+    "--warmup-budget",
+    envvar="CME_WARMUP_BUDGET",
+    type=click.FloatRange(min=0, max=1, min_open=True),
+    default=c.Defaults.warmup_budget,
+    show_default=True,
+    help="Maximum fraction of time the background warm-up may be busy.",
+)
+@click.option(
+    "--warmup-templates",
+    envvar="CME_WARMUP_TEMPLATES",
+    default=c.Defaults.warmup_templates,
+    help=(
+        "Comma separated IDs of the templates to warm up."
+        " By default, all stable templates are warmed up."
+    ),
+)
+@click.option(
+    "--report-threads",
+    envvar="CME_REPORT_THREADS",
+    type=click.IntRange(min=1),
+    default=c.Defaults.report_threads,
+    show_default=True,
+    help="Maximum number of reports rendered at the same time per worker.",
+)
+@click.option(
+    "--diagram-threads",
+    envvar="CME_DIAGRAM_THREADS",
+    type=click.IntRange(min=1),
+    default=c.Defaults.diagram_threads,
+    show_default=True,
+    help="Maximum number of diagrams rendered at the same time per worker.",
+)
+@click.option(
+    "--diagram-stream/--no-diagram-stream",
+    envvar="CME_DIAGRAM_STREAM",
+    default=c.Defaults.diagram_stream,
+    show_default=True,
+    help=(
+        "Deliver all diagrams of a report over a single event stream,"
+        " instead of requesting each diagram separately."
+    ),
+)
+@click.option(
+    "--render-processes",
+    envvar="CME_RENDER_PROCESSES",
+    type=click.IntRange(min=0),
+    default=c.Defaults.render_processes,
+    show_default=True,
+    help=(
+        "Number of forked processes per worker that render reports and"
+        " diagrams. 0 renders in the worker's threads. Requires"
+        " '--no-live-mode' and cannot be used with '--dev'."
+    ),
+)
+@click.option(
+    "--render-timeout",
+    envvar="CME_RENDER_TIMEOUT",
+    type=click.FloatRange(min=0),
+    default=c.Defaults.render_timeout,
+    show_default=True,
+    help=(
+        "Time in seconds after which rendering a report is aborted,"
+        " unless the template specifies its own 'timeout'. 0 disables it."
+    ),
+)
+@click.option(
+    "--slow-render-threshold",
+    envvar="CME_SLOW_RENDER_THRESHOLD",
+    type=click.FloatRange(min=0),
+    default=c.Defaults.slow_render_threshold,
+    show_default=True,
+    help=(
+        "Log reports and diagrams that take longer than this many seconds"
+        " to render. 0 disables it."
+    ),
+)
+@click.option(
+    "--stream-documents/--no-stream-documents",
+    envvar="CME_STREAM_DOCUMENTS",
+    default=c.Defaults.stream_documents,
+    show_default=True,
+    help=(
+        "Send document reports to the browser in chunks while they are"
+        " being rendered. Streamed reports are always rendered in the"
+        " worker's threads, even with '--render-processes'."
+    ),
+)
+@click.option(
+    "-w",
+    "--workers",
+    envvar="CME_WORKERS",
+    type=click.IntRange(min=1),
+    default=c.Defaults.workers,
+    show_default=True,
+    help=(
+        "Number of worker processes serving requests. With more than one,"
+        " the model is loaded once and shared with forked workers."
+        " Requires '--no-live-mode' and cannot be used with '--dev'."
+    ),
+)
 @click.option(
     "--route-prefix",
     envvar="CME_ROUTE_PREFIX",
     default="",
     show_default=True,
     help="Add a prefix to all web routes."
-    f" (Note: this prefix does not apply to '{app.metrics.to()}').",
+    " (Note: this prefix does not apply to '/metrics').",
 )
 @click.option(
     "--image",
@@ -380,8 +618,28 @@ def run(
     host: str,
     port: int,
     model: str,
+    model_snapshot: bool,
+    cache_dir: str,
     templates_dir: str,
     live_mode: bool,
+    lazy_instances: bool,
+    template_workers: int,
+    render_cache_size: int,
+    render_cache_disk: bool,
+    diagram_cache_size: int,
+    diagram_memory_cache_size: int,
+    layout_memory_cache_size: int,
+    warmup: bool,
+    warmup_budget: float,
+    warmup_templates: str,
+    report_threads: int,
+    diagram_threads: int,
+    diagram_stream: bool,
+    render_processes: int,
+    render_timeout: float,
+    slow_render_threshold: float,
+    stream_documents: bool,
+    workers: int,
     route_prefix: str,
     image: str,
     skip_rebuild: bool,
@@ -391,8 +649,30 @@ def run(
     os.environ["CME_HOST"] = host
     os.environ["CME_PORT"] = str(port)
     os.environ["CME_MODEL"] = model
+    os.environ["CME_MODEL_SNAPSHOT"] = "01"[model_snapshot]
+    os.environ["CME_CACHE_DIR"] = cache_dir
     os.environ["CME_TEMPLATES_DIR"] = templates_dir
     os.environ["CME_LIVE_MODE"] = "1" if live_mode else "0"
+    os.environ["CME_LAZY_INSTANCES"] = "01"[lazy_instances]
+    os.environ["CME_TEMPLATE_WORKERS"] = str(template_workers)
+    os.environ["CME_RENDER_CACHE_SIZE"] = str(render_cache_size)
+    os.environ["CME_RENDER_CACHE_DISK"] = "01"[render_cache_disk]
+    os.environ["CME_DIAGRAM_CACHE_SIZE"] = str(diagram_cache_size)
+    os.environ["CME_DIAGRAM_MEMORY_CACHE_SIZE"] = str(
+        diagram_memory_cache_size
+    )
+    os.environ["CME_LAYOUT_MEMORY_CACHE_SIZE"] = str(layout_memory_cache_size)
+    os.environ["CME_WARMUP"] = "01"[warmup]
+    os.environ["CME_WARMUP_BUDGET"] = str(warmup_budget)
+    os.environ["CME_WARMUP_TEMPLATES"] = warmup_templates
+    os.environ["CME_REPORT_THREADS"] = str(report_threads)
+    os.environ["CME_DIAGRAM_THREADS"] = str(diagram_threads)
+    os.environ["CME_DIAGRAM_STREAM"] = "01"[diagram_stream]
+    os.environ["CME_RENDER_PROCESSES"] = str(render_processes)
+    os.environ["CME_RENDER_TIMEOUT"] = str(render_timeout)
+    os.environ["CME_SLOW_RENDER_THRESHOLD"] = str(slow_render_threshold)
+    os.environ["CME_STREAM_DOCUMENTS"] = "01"[stream_documents]
+    os.environ["CME_WORKERS"] = str(workers)
     os.environ["CME_ROUTE_PREFIX"] = route_prefix
     os.environ["CME_DOCKER_IMAGE_NAME"] = image
     os.environ["CME_DEBUG_SPINNER"] = "01"[debug_spinner]
@@ -402,6 +682,11 @@ def run(
         raise click.UsageError(
             "Options --container and --dev are mutually exclusive."
         )
+    if (workers > 1 or render_processes) and (dev or live_mode):
+        raise click.UsageError(
+            "Multiple workers and render processes require --no-live-mode"
+            " and cannot be used with --dev."
+        )
 
     if container:
         run_container(log_config=ctx.obj["log_config"])
@@ -428,6 +713,163 @@ def build(*, watch: bool) -> None:
             pass
 
 
+@main.command("bench-startup")
+@click.option(
+    "-n",
+    "--runs",
+    type=click.IntRange(min=1),
+    default=5,
+    show_default=True,
+    help="How often to run the startup sequence.",
+)
+@click.option(
+    "-m",
+    "--model",
+    envvar="CME_MODEL",
+    default=c.Defaults.model,
+    show_default=True,
+    help="The Capella model to load (file, URL or JSON string).",
+)
+@click.option(
+    "-t",
+    "--templates-dir",
+    envvar="CME_TEMPLATES_DIR",
+    default=str(c.Defaults.templates_dir.resolve()),
+    show_default=True,
+    help="The directory containing the templates.",
+)
+@click.option(
+    "--model-snapshot/--no-model-snapshot",
+    envvar="CME_MODEL_SNAPSHOT",
+    default=c.Defaults.model_snapshot,
+    show_default=True,
+    help=(
+        "Use model snapshots. Usually only the first run then loads the"
+        " original model files, and later runs load the snapshot."
+    ),
+)
+@click.pass_context
+def bench_startup(
+    ctx: click.Context,
+    /,
+    *,
+    runs: int,
+    model: str,
+    templates_dir: str,
+    model_snapshot: bool,
+) -> None:
+    """Benchmark the startup sequence without starting the server.
+
+    Loads the model and templates RUNS times in a row and prints the
+    percentiles of each startup phase. Imports and asset hashing only
+    happen once per process and are reported as a single sample. Model
+    loading and the total are reported separately for runs that loaded
+    the original model files and runs that loaded a snapshot.
+    """
+    from capella_model_explorer import app, core, state  # noqa: PLC0415
+
+    logging.config.dictConfig(ctx.obj["log_config"])
+    os.environ["CME_MODEL"] = model
+    os.environ["CME_TEMPLATES_DIR"] = templates_dir
+    os.environ["CME_MODEL_SNAPSHOT"] = "01"[model_snapshot]
+    importlib.reload(c)
+
+    samples: dict[str, list[float]] = collections.defaultdict(list)
+    for phase in ("imports", "assets"):
+        if phase in core.startup_times:
+            samples[phase].append(core.startup_times[phase])
+
+    for i in range(1, runs + 1):
+        logger.info("Startup benchmark run %d of %d", i, runs)
+        state.ready.clear()
+        app.load()
+        if not state.ready.is_set():
+            raise SystemExit("Startup failed, see the log for details")
+        assert state.load_finished is not None
+        source = state.model_load_source
+        logger.info("Loaded the model from: %s", source)
+        for phase in ("loadinfo", "model", "templates", "environment"):
+            name = f"{phase} ({source})" if phase == "model" else phase
+            samples[name].append(core.startup_times[phase])
+        samples[f"total ({source})"].append(
+            state.load_finished - state.load_started
+        )
+
+    click.echo(
+        f"{'phase':<18} {'n':>3} {'min':>8} {'p50':>8}"
+        f" {'p90':>8} {'p99':>8} {'max':>8}"
+    )
+    for phase, values in samples.items():
+        values.sort()
+        percentiles = " ".join(
+            f"{_percentile(values, q):8.3f}" for q in (0, 50, 90, 99, 100)
+        )
+        click.echo(f"{phase:<18} {len(values):>3} {percentiles}")
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    """Compute the nearest-rank percentile of an already sorted list."""
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+@main.command("export")
+@click.argument(
+    "output",
+    type=click.Path(file_okay=False, path_type=pathlib.Path),
+)
+@click.option(
+    "-m",
+    "--model",
+    envvar="CME_MODEL",
+    default=c.Defaults.model,
+    show_default=True,
+    help="The Capella model to load (file, URL or JSON string).",
+)
+@click.option(
+    "-t",
+    "--templates-dir",
+    envvar="CME_TEMPLATES_DIR",
+    default=str(c.Defaults.templates_dir.resolve()),
+    show_default=True,
+    help="The directory containing the templates.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    show_default="number of CPU cores",
+    help="Number of processes rendering reports and diagrams.",
+)
+@click.pass_context
+def export_cmd(
+    ctx: click.Context,
+    /,
+    *,
+    output: pathlib.Path,
+    model: str,
+    templates_dir: str,
+    jobs: int,
+) -> None:
+    """Export all reports as a static website into OUTPUT.
+
+    Every template is rendered for all of its instances, together with
+    the diagrams they contain. Exporting into the same directory again
+    only renders reports and diagrams that may have changed, unless the
+    revision of the model cannot be determined.
+    """
+    logging.config.dictConfig(ctx.obj["log_config"])
+    os.environ["CME_MODEL"] = model
+    os.environ["CME_TEMPLATES_DIR"] = templates_dir
+    os.environ["CME_LIVE_MODE"] = "0"
+    importlib.reload(c)
+
+    from capella_model_explorer import export  # noqa: PLC0415
+
+    export.export(output, processes=jobs)
+
+
 @main.command("pre-commit-setup")
 def pre_commit_setup_cmd() -> None:
     """Install tools needed for pre-commit hooks."""
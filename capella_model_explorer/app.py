@@ -3,68 +3,285 @@
 
 from __future__ import annotations
 
+import asyncio
+import collections.abc as cabc
 import contextlib
+import hashlib
 import json
 import logging
+import multiprocessing
+import os
 import pathlib
 import tempfile
+import threading
 import time
 import traceback
 import typing as t
+import urllib.parse
 
 import capellambse
 import jinja2
 import prometheus_client
+import prometheus_client.multiprocess
 import starlette
 import starlette.middleware
+import starlette.responses
+import starlette.types
 from fasthtml import common as fh
 from fasthtml import ft
 
+import capella_model_explorer
 import capella_model_explorer.constants as c
-from capella_model_explorer import components, reports, state
+from capella_model_explorer import (
+    cache,
+    components,
+    core,
+    executors,
+    layout,
+    reports,
+    snapshot,
+    state,
+    warmup,
+)
 
 logger = logging.getLogger(__name__)
 
+report_render_seconds = prometheus_client.Histogram(
+    "report_render_seconds",
+    "Time spent rendering reports, excluding render cache hits",
+    ["template_id"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+diagram_render_seconds = prometheus_client.Histogram(
+    "diagram_render_seconds",
+    "Time spent rendering diagrams, excluding render cache hits",
+    ["diagram_type", "attribute"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+rendered_size_bytes = prometheus_client.Histogram(
+    "rendered_size_bytes",
+    "Size of freshly rendered reports and diagrams",
+    ["kind"],
+    buckets=tuple(2**i for i in range(10, 27, 2)),
+)
+
 
 @contextlib.asynccontextmanager
 async def lifespan(_):
+    if not state.ready.is_set():
+        log_configuration()
+        loader = threading.Thread(
+            target=load, name="model-loader", daemon=True
+        )
+        loader.start()
+    # Warming up every worker would repeat the same renders, the other
+    # workers benefit through the shared disk caches instead
+    if c.WARMUP and state.worker_index == 0:
+        warmup.start()
+    yield
+    # Uvicorn re-raises the signal that stopped it after this returns
+    render_farm.shutdown()
+
+
+def log_configuration() -> None:
     logger.info("Configuration:")
     logger.info("\tRoute prefix: '%s'", c.ROUTE_PREFIX)
     logger.info("\tLive mode: %s", c.LIVE_MODE)
     logger.info("\tHost: '%s'", c.HOST)
     logger.info("\tCapella model: '%s'", c.MODEL)
     logger.info("\tTemplates directory: '%s'", c.TEMPLATES_DIR)
+    logger.info("\tModel snapshots: %s", c.MODEL_SNAPSHOT)
+    logger.info("\tCache directory: '%s'", c.CACHE_DIR)
+    logger.info("\tWorkers: %d", c.WORKERS)
+    for phase in ("imports", "assets"):
+        core.log_startup_phase(phase)
+
+
+def load() -> None:
+    """Load the model and templates, and set up the Jinja environment.
+
+    This runs in a background thread, so that the server can already
+    answer health checks and metrics requests while loading.
+    """
+    state.load_started = time.time()
+    try:
+        _set_load_phase("model")
+        with core.timed_startup_phase("loadinfo"):
+            model_spec = capellambse.loadinfo(c.MODEL)
+        logger.info("Loading model from: %s", model_spec["path"])
+        with core.timed_startup_phase("model"):
+            state.model, state.model_revision = snapshot.load_model(model_spec)
+        logger.info("Loading templates from: %s", c.TEMPLATES_DIR)
+        _set_load_phase("templates")
+        with core.timed_startup_phase("templates"):
+            reports.load_templates()
+        _set_load_phase("environment")
+        with core.timed_startup_phase("environment"):
+            state.jinja_env = _make_jinja_env()
+            state.render_cache = _make_render_cache()
+            state.diagram_cache = _make_diagram_cache()
+            state.layout_cache = _make_layout_cache()
+            layout.install()
+    except Exception:
+        logger.exception("Cannot load the model and templates")
+        _set_load_phase("failed")
+        return
+    finally:
+        state.load_finished = time.time()
+
+    logger.info(
+        "Ready to serve requests after %.2fs",
+        state.load_finished - state.load_started,
+    )
+    _set_load_phase("ready")
+    state.ready.set()
+
 
-    model_spec = capellambse.loadinfo(c.MODEL)
-    logger.info("Loading model from: %s", model_spec["path"])
-    state.model = capellambse.MelodyModel(**model_spec)
-    logger.info("Loading templates from: %s", c.TEMPLATES_DIR)
-    reports.load_templates()
-    state.jinja_env = jinja2.Environment(
+def _set_load_phase(phase: str) -> None:
+    state.load_phase = phase
+    state.load_phase_enum.state(phase)
+
+
+def _make_jinja_env() -> jinja2.Environment:
+    env = reports.RenderEnvironment(
         autoescape=True,
         loader=jinja2.FileSystemLoader(c.TEMPLATES_DIR),
         lstrip_blocks=True,
         trim_blocks=True,
     )
-    state.jinja_env.finalize = reports.finalize
-    state.jinja_env.filters["make_href"] = reports.make_href_filter
-    state.jinja_env.globals["render_diagram"] = reports.diagram_placeholder
-    state.jinja_env.tests["diagram"] = lambda obj: isinstance(
+    env.finalize = reports.finalize
+    env.filters["make_href"] = reports.make_href_filter
+    env.globals["render_diagram"] = reports.diagram_placeholder
+    env.tests["diagram"] = lambda obj: isinstance(
         obj, capellambse.model.AbstractDiagram | capellambse.diagram.Diagram
     )
-    state.jinja_env.tests["modelelement"] = lambda obj: isinstance(
+    env.tests["modelelement"] = lambda obj: isinstance(
         obj, capellambse.model.ModelElement
     )
-    yield
+    return env
+
+
+def _make_render_cache() -> cache.RenderCache:
+    directory = None
+    if c.RENDER_CACHE_DISK:
+        directory = c.CACHE_DIR / "reports"
+    return cache.RenderCache(
+        "report",
+        max_size=c.RENDER_CACHE_SIZE * 1024 * 1024,
+        directory=directory,
+    )
+
+
+def _make_diagram_cache() -> cache.RenderCache:
+    # Diagrams don't depend on templates, so unlike reports they can be
+    # kept on disk in live mode too.
+    directory = None
+    if c.DIAGRAM_CACHE_SIZE:
+        directory = c.CACHE_DIR / "diagrams"
+    return cache.RenderCache(
+        "diagram",
+        max_size=c.DIAGRAM_MEMORY_CACHE_SIZE * 1024 * 1024,
+        directory=directory,
+        max_disk_size=c.DIAGRAM_CACHE_SIZE * 1024 * 1024,
+        suffix=".svg",
+    )
+
+
+def _make_layout_cache() -> cache.RenderCache:
+    directory = None
+    if c.DIAGRAM_CACHE_SIZE:
+        directory = c.CACHE_DIR / "layouts"
+    return cache.RenderCache(
+        "layout",
+        max_size=c.LAYOUT_MEMORY_CACHE_SIZE * 1024 * 1024,
+        directory=directory,
+        max_disk_size=c.DIAGRAM_CACHE_SIZE * 1024 * 1024,
+        suffix=".json",
+    )
+
+
+UNGATED_PATHS = frozenset({"/healthz", "/metrics", "/readyz"})
+"""Paths that are served even while the model is still loading."""
+
+
+# Both middlewares are plain ASGI middlewares, as BaseHTTPMiddleware hides
+# client disconnects from the request handlers (see rendered_report)
+class UpdateLastInteractionTimeMiddleware:
+    def __init__(self, app: starlette.types.ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self,
+        scope: starlette.types.Scope,
+        receive: starlette.types.Receive,
+        send: starlette.types.Send,
+    ) -> None:
+        if scope["type"] == "http" and scope["path"] not in (
+            *UNGATED_PATHS,
+            "/favicon.ico",
+        ):
+            state.last_interaction.value = time.time()
+        await self.app(scope, receive, send)
 
 
-class UpdateLastInteractionTimeMiddleware(
-    starlette.middleware.base.BaseHTTPMiddleware
-):
-    async def dispatch(self, request, call_next):
-        if request.url.path not in ("/metrics", "/favicon.ico"):
-            state.last_interaction = time.time()
-        return await call_next(request)
+class LoadingPageMiddleware:
+    """Serve a loading page for UI routes until the model is loaded."""
+
+    def __init__(self, app: starlette.types.ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self,
+        scope: starlette.types.Scope,
+        receive: starlette.types.Receive,
+        send: starlette.types.Send,
+    ) -> None:
+        if scope["type"] == "http":
+            path = scope["path"]
+            if not (
+                state.ready.is_set()
+                or path in UNGATED_PATHS
+                or path.startswith(f"{c.ROUTE_PREFIX}/static/")
+            ):
+                scope = {**scope, "path": f"{c.ROUTE_PREFIX}/loading"}
+        await self.app(scope, receive, send)
+
+
+class TabRenders:
+    """The latest report render requested by each browser tab.
+
+    Consecutive requests from one tab may be served by different worker
+    processes, so renders are recorded in memory that is shared with all
+    processes forked after this was created. Each tab is assigned a slot
+    by a hash of its ID. Tabs sharing a slot never supersede each other's
+    renders, though a tab may then miss superseding its own.
+    """
+
+    def __init__(self, slots: int) -> None:
+        self._slots = multiprocessing.Array("Q", 2 * slots)
+
+    def start(self, tab_id: str) -> int:
+        """Record a new render as the latest of a tab, and return its ID."""
+        tab, slot = self._locate(tab_id)
+        render_id = int.from_bytes(os.urandom(8))
+        with self._slots.get_lock():
+            self._slots[slot : slot + 2] = [tab, render_id]
+        return render_id
+
+    def is_latest(self, tab_id: str, render_id: int) -> bool:
+        """Check whether a newer render was started for the same tab."""
+        tab, slot = self._locate(tab_id)
+        with self._slots.get_lock():
+            other_tab, latest = self._slots[slot : slot + 2]
+        return other_tab != tab or latest == render_id
+
+    def _locate(self, tab_id: str) -> tuple[int, int]:
+        tab = int.from_bytes(
+            hashlib.blake2b(
+                tab_id.encode(), digest_size=8, usedforsecurity=False
+            ).digest()
+        )
+        return tab, 2 * (tab % (len(self._slots) // 2))
 
 
 if c.LIVE_MODE:
@@ -81,23 +298,92 @@ app = _app_cls(
     lifespan=lifespan,
     middleware=[
         starlette.middleware.Middleware(UpdateLastInteractionTimeMiddleware),
+        starlette.middleware.Middleware(LoadingPageMiddleware),
     ],
     pico=False,
 )
 ar = fh.APIRouter(prefix=c.ROUTE_PREFIX)
+# Renders in these executors are interactive, the warm-up pauses for them
+report_executor = executors.RenderExecutor(
+    "report", c.REPORT_THREADS, in_flight=state.renders_in_flight
+)
+diagram_executor = executors.RenderExecutor(
+    "diagram", c.DIAGRAM_THREADS, in_flight=state.renders_in_flight
+)
+render_farm = executors.RenderFarm(c.RENDER_PROCESSES)
+report_flights = executors.SingleFlight(
+    "report", retry_on=(executors.RenderCancelled,)
+)
+diagram_flights = executors.SingleFlight("diagram")
+tab_renders = TabRenders(1024)
+DISCONNECT_POLL_INTERVAL = 0.25
+"""Time in seconds between checks whether a render is still needed.
+
+A render is no longer needed once the client has disconnected, or the
+same browser tab has requested another report.
+"""
+STREAM_CHUNK_SIZE = 16 * 1024
+"""Minimum number of characters sent at once when streaming reports."""
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+"""Time in seconds that browsers may cache immutable diagram images."""
+SVG_CONTENT_SECURITY_POLICY = (
+    "default-src 'none'; img-src data:; style-src 'unsafe-inline'"
+)
 app.static_route_exts(f"{c.ROUTE_PREFIX}/static", "./static")
 
 
 @app.get("/metrics")
 def metrics() -> t.Any:
-    idle_time_minutes = (time.time() - state.last_interaction) / 60
+    idle_time_minutes = (time.time() - state.last_interaction.value) / 60
     state.idle_time_gauge.set(idle_time_minutes)
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        prometheus_client.multiprocess.MultiProcessCollector(registry)
+        for collector in state.loaded_state_collectors:
+            registry.register(collector)
+    else:
+        registry = prometheus_client.REGISTRY
+
     return fh.Response(
-        content=prometheus_client.generate_latest(),
+        content=prometheus_client.generate_latest(registry),
         media_type="text/plain",
     )
 
 
+@app.get("/healthz")
+def healthz() -> t.Any:
+    """Report whether the server is alive.
+
+    The server counts as alive while loading, but not if loading failed.
+    """
+    if state.load_phase == "failed":
+        return fh.Response("Loading failed", status_code=500)
+    return fh.Response("OK", media_type="text/plain")
+
+
+@app.get("/readyz")
+def readyz() -> t.Any:
+    """Report whether the model is loaded and requests can be served."""
+    if not state.ready.is_set():
+        return fh.Response(
+            "Loading", status_code=503, headers={"Retry-After": "5"}
+        )
+    return fh.Response("OK", media_type="text/plain")
+
+
+@ar.get("/loading")
+def loading(request: starlette.requests.Request) -> t.Any:
+    headers = [fh.HttpHeader("Retry-After", "5")]
+    if request.headers.get("HX-Request") == "true":
+        headers.append(fh.HttpHeader("HX-Refresh", "true"))
+    return (
+        ft.Title("Loading - Model Explorer"),
+        components.loading_page(),
+        *headers,
+    )
+
+
 @app.get("/")
 def prefix_redirect(request) -> t.Any:
     if c.ROUTE_PREFIX:
@@ -134,62 +420,441 @@ def model_object_list(
 
 
 @ar.get("/rendered-report")
-def rendered_report(template_id: str, model_element_uuid: str = "") -> t.Any:
+async def rendered_report(
+    request: starlette.requests.Request,
+    template_id: str,
+    model_element_uuid: str = "",
+) -> t.Any:
     """Render and return report.
 
     Takes the template and model element from the application state and
-    returns the rendered template.
+    returns the rendered template. Document templates may be streamed to
+    the client while they are being rendered.
+
+    The render is cancelled if the client disconnects, or if the same
+    browser tab (identified by the ``Tab-ID`` header) requests another
+    report before this one is done.
     """
     template = reports.template_by_id(template_id)
     assert template is not None
-    model_element = (
-        state.model.by_uuid(model_element_uuid) if model_element_uuid else None
-    )
-    template_content = template.path.read_text(encoding="utf8")
-    jinja_template = state.jinja_env.from_string(template_content)
+    tab_id = request.headers.get("Tab-ID")
+    render_id = tab_renders.start(tab_id) if tab_id else None
+
+    cache_key = report_cache_key(template, model_element_uuid)
+    etag = _make_etag(cache_key)
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+
+    cancellation = executors.RenderCancellation(template.render_timeout)
+    tab = (tab_id, render_id) if tab_id and render_id is not None else None
+    if (
+        c.STREAM_DOCUMENTS
+        and template.isDocument
+        and state.render_cache.get(cache_key) is None
+    ):
+        return starlette.responses.StreamingResponse(
+            _stream_report(template, model_element_uuid, cancellation, tab),
+            media_type="text/html; charset=utf-8",
+            # The render may still fail after the headers have been sent,
+            # so there is no ETag and the response is not stored. Once the
+            # report is in the render cache, it is served with an ETag.
+            headers={"Cache-Control": "no-store"},
+        )
+
+    watchers = [
+        asyncio.create_task(_cancel_on_disconnect(request, cancellation))
+    ]
+    if tab is not None:
+        watchers.append(
+            asyncio.create_task(_cancel_when_superseded(*tab, cancellation))
+        )
     try:
-        rendered_template = jinja_template.render(
-            object=model_element,
-            model=state.model,
-            diff_data={},
-            object_diff={},
+        rendered_template = await report_flights.run(
+            cache_key,
+            report_executor.run,
+            render_report_html,
+            template,
+            model_element_uuid,
+            cancellation,
         )
+    except executors.RenderCancelled as err:
+        logger.debug("Render of template %r cancelled: %s", template_id, err)
+        return fh.Response(status_code=204)
     except Exception:
-        elem_repr = ""
-        try:
-            if model_element is not None:
-                elem_repr = model_element._short_repr_()
-        except Exception:
-            pass
-        logger.exception(
-            "Error rendering template %r with object %s",
-            template_id,
-            elem_repr or repr(model_element_uuid),
-        )
+        _log_render_error(template_id, model_element_uuid)
+        return _render_error_box(traceback.format_exc())
+    finally:
+        for watcher in watchers:
+            watcher.cancel()
+    return (
+        _report_content(
+            fh.NotStr(rendered_template),
+            _diagram_stream_url(template_id, model_element_uuid),
+        ),
+        *_cache_headers(etag),
+    )
 
-        full_traceback = traceback.format_exc()
-        return ft.Div(
-            ft.Div("Error rendering template:", cls="text-xl"),
-            fh.Pre(
-                full_traceback,
-                cls="text-xs prose dark:prose-invert",
-            ),
-            cls="dark:text-neutral-100 grow content-center",
-        )
-    content = ft.Div(
-        fh.NotStr(rendered_template),
+
+def _make_etag(cache_key: str) -> str:
+    digest = hashlib.blake2b(
+        cache_key.encode("utf-8"), digest_size=16, usedforsecurity=False
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def _etag_matches(request: starlette.requests.Request, etag: str) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (
+        i.strip().removeprefix("W/") for i in if_none_match.split(",")
+    )
+    return etag in candidates
+
+
+def _cache_headers(etag: str) -> tuple[fh.HttpHeader, ...]:
+    return (
+        fh.HttpHeader("Cache-Control", f"max-age={c.CACHE_MAX_AGE}"),
+        fh.HttpHeader("Vary", "Render-Environment"),
+        fh.HttpHeader("ETag", etag),
+    )
+
+
+def _not_modified(etag: str) -> starlette.responses.Response:
+    return starlette.responses.Response(
+        status_code=304,
+        headers={i.k: i.v for i in _cache_headers(etag)},
+    )
+
+
+def _report_content(
+    rendered: fh.NotStr, diagram_stream_url: str = ""
+) -> ft.Div:
+    return ft.Div(
+        rendered,
+        # Fills the report's diagram placeholders, see frontend/app.js
+        ft.Div(data_diagram_stream=diagram_stream_url, cls="diagram-stream"),
         ft.Script(
             "document.getElementById('root').classList.remove('h-screen');"
             "document.getElementById('print-button').classList.remove('hidden');"
         ),
         cls="prose svg-display dark:prose-invert",
     )
-    return (
-        content,
-        fh.HttpHeader("Cache-Control", f"max-age={c.CACHE_MAX_AGE}"),
-        fh.HttpHeader("Vary", "Render-Environment"),
+
+
+def _render_error_box(full_traceback: str) -> ft.Div:
+    return ft.Div(
+        ft.Div("Error rendering template:", cls="text-xl"),
+        fh.Pre(
+            full_traceback,
+            cls="text-xs prose dark:prose-invert",
+        ),
+        cls="dark:text-neutral-100 grow content-center",
+    )
+
+
+def _log_render_error(template_id: str, model_element_uuid: str) -> None:
+    logger.exception(
+        "Error rendering template %r with object %s",
+        template_id,
+        _element_repr(model_element_uuid),
+    )
+
+
+def _element_repr(model_element_uuid: str) -> str:
+    try:
+        if model_element_uuid:
+            return state.model.by_uuid(model_element_uuid)._short_repr_()
+    except Exception:
+        pass
+    return repr(model_element_uuid)
+
+
+def _observe_report_render(
+    template_id: str, model_element_uuid: str, seconds: float, size: int
+) -> None:
+    report_render_seconds.labels(template_id).observe(seconds)
+    rendered_size_bytes.labels("report").observe(size)
+    if c.SLOW_RENDER_THRESHOLD and seconds >= c.SLOW_RENDER_THRESHOLD:
+        logger.warning(
+            "Slow render of template %r with object %s",
+            template_id,
+            _element_repr(model_element_uuid),
+            extra={
+                "template_id": template_id,
+                "uuid": model_element_uuid,
+                "seconds": round(seconds, 3),
+                "size": size,
+            },
+        )
+
+
+def _observe_diagram_render(
+    diag: capellambse.model.AbstractDiagram,
+    parent: str,
+    attr: str,
+    seconds: float,
+    size: int,
+) -> None:
+    try:
+        diagram_type = diag.type.name
+    except Exception:
+        diagram_type = "unknown"
+    diagram_render_seconds.labels(diagram_type, attr).observe(seconds)
+    rendered_size_bytes.labels("diagram").observe(size)
+    if c.SLOW_RENDER_THRESHOLD and seconds >= c.SLOW_RENDER_THRESHOLD:
+        logger.warning(
+            "Slow render of diagram %r on %s",
+            attr,
+            _element_repr(parent),
+            extra={
+                "diagram_type": diagram_type,
+                "attribute": attr,
+                "uuid": parent,
+                "seconds": round(seconds, 3),
+                "size": size,
+            },
+        )
+
+
+async def _stream_report(
+    template: reports.Template,
+    model_element_uuid: str,
+    cancellation: executors.RenderCancellation,
+    tab: tuple[str, int] | None,
+) -> cabc.AsyncIterator[str]:
+    """Stream a report while it is being rendered.
+
+    The report container is sent first, followed by chunks of the report
+    as they are rendered. Like other report renders, identical streamed
+    renders are coalesced: Only the request that starts the render
+    receives the report in chunks, the others receive it as a whole once
+    it is done.
+    """
+    marker = "<!-- report -->"
+    head = fh.to_xml(_report_content(fh.NotStr(marker))).split(marker)[0]
+    chunks: asyncio.Queue[str | None] = asyncio.Queue()
+    render = asyncio.create_task(
+        report_flights.run(
+            report_cache_key(template, model_element_uuid),
+            _render_report_stream,
+            template,
+            model_element_uuid,
+            cancellation,
+            chunks,
+        )
     )
 
+    def end_of_chunks(future: asyncio.Future[str]) -> None:
+        # Mark the exception as retrieved, in case the client is gone
+        if not future.cancelled():
+            future.exception()
+        chunks.put_nowait(None)
+
+    render.add_done_callback(end_of_chunks)
+    watcher = None
+    if tab is not None:
+        watcher = asyncio.create_task(
+            _cancel_when_superseded(*tab, cancellation)
+        )
+    streamed = False
+    try:
+        yield head
+        while (chunk := await chunks.get()) is not None:
+            streamed = True
+            yield chunk
+        rendered = render.result()
+    except executors.RenderCancelled as err:
+        logger.debug("Render of template %r cancelled: %s", template.id, err)
+        return
+    except Exception:
+        _log_render_error(template.id, model_element_uuid)
+        yield fh.to_xml(_render_error_box(traceback.format_exc()))
+        return
+    finally:
+        cancellation.cancel("stream closed")
+        render.cancel()
+        if watcher is not None:
+            watcher.cancel()
+
+    if not streamed:
+        yield rendered
+    diagram_stream_url = _diagram_stream_url(template.id, model_element_uuid)
+    yield fh.to_xml(
+        _report_content(fh.NotStr(marker), diagram_stream_url)
+    ).split(marker)[1]
+
+
+async def _render_report_stream(
+    template: reports.Template,
+    model_element_uuid: str,
+    cancellation: executors.RenderCancellation,
+    chunks: asyncio.Queue[str | None],
+) -> str:
+    """Render a report in chunks, and put each into ``chunks`` when done.
+
+    Generators can't be sent to render processes, so streamed reports are
+    always rendered in the report executor's threads. Afterwards, the
+    report and its diagrams are stored in the render cache like those of
+    :func:`render_report_html`.
+    """
+    parts: list[str] = []
+    diagrams: list[tuple[str, str, str]] = []
+    memo = reports.RenderMemo()
+    started = time.perf_counter()
+    render_time = 0.0
+    generator = await report_executor.run(
+        _start_report_stream, template, model_element_uuid
+    )
+    while chunk := await report_executor.run(
+        _next_report_chunk, generator, cancellation, memo, diagrams
+    ):
+        render_time += time.perf_counter() - started
+        parts.append(chunk)
+        chunks.put_nowait(chunk)
+        started = time.perf_counter()
+    render_time += time.perf_counter() - started
+
+    rendered = "".join(parts)
+    _observe_report_render(
+        template.id,
+        model_element_uuid,
+        render_time,
+        len(rendered.encode("utf-8")),
+    )
+    cache_key = report_cache_key(template, model_element_uuid)
+    state.render_cache.put(cache_key, rendered)
+    state.render_cache.put(f"{cache_key}\0diagrams", json.dumps(diagrams))
+    return rendered
+
+
+def _start_report_stream(
+    template: reports.Template, model_element_uuid: str
+) -> cabc.Iterator[str]:
+    model_element = (
+        state.model.by_uuid(model_element_uuid) if model_element_uuid else None
+    )
+    return template.load_jinja_template().generate(
+        object=model_element,
+        model=state.model,
+        diff_data={},
+        object_diff={},
+    )
+
+
+def _next_report_chunk(
+    generator: cabc.Iterator[str],
+    cancellation: executors.RenderCancellation,
+    memo: reports.RenderMemo,
+    diagrams: list[tuple[str, str, str]],
+) -> str:
+    chunks: list[str] = []
+    size = 0
+    diagrams_token = reports.collected_diagrams.set(diagrams)
+    cancellation_token = reports.render_cancellation.set(cancellation)
+    memo_token = reports.render_memo.set(memo)
+    try:
+        for chunk in generator:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_CHUNK_SIZE:
+                break
+    finally:
+        reports.render_memo.reset(memo_token)
+        reports.render_cancellation.reset(cancellation_token)
+        reports.collected_diagrams.reset(diagrams_token)
+    return "".join(chunks)
+
+
+def report_cache_key(
+    template: reports.Template, model_element_uuid: str
+) -> str:
+    """Compute the render cache key for a report."""
+    return f"{reports.compute_cache_key(template)}\0{model_element_uuid}"
+
+
+async def _cancel_on_disconnect(
+    request: starlette.requests.Request,
+    cancellation: executors.RenderCancellation,
+) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+    cancellation.cancel("client disconnected")
+
+
+async def _cancel_when_superseded(
+    tab_id: str, render_id: int, cancellation: executors.RenderCancellation
+) -> None:
+    while tab_renders.is_latest(tab_id, render_id):
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+    cancellation.cancel("superseded by a newer request")
+
+
+def render_report_html(
+    template: reports.Template,
+    model_element_uuid: str,
+    cancellation: executors.RenderCancellation | None = None,
+) -> str:
+    """Render a report to HTML, or get it from the render cache.
+
+    Successfully rendered reports are cached on the server, so that each
+    report only needs to be rendered once for all users.
+    """
+    if cancellation is None:
+        cancellation = executors.RenderCancellation(template.render_timeout)
+    cache_key = report_cache_key(template, model_element_uuid)
+    rendered = state.render_cache.get(cache_key)
+    if rendered is None:
+        started = time.perf_counter()
+        rendered, diagrams = render_farm.call_cancellable(
+            cancellation.check,
+            _render_report,
+            template.id,
+            model_element_uuid,
+            cancellation,
+        )
+        _observe_report_render(
+            template.id,
+            model_element_uuid,
+            time.perf_counter() - started,
+            len(rendered.encode("utf-8")),
+        )
+        state.render_cache.put(cache_key, rendered)
+        state.render_cache.put(f"{cache_key}\0diagrams", json.dumps(diagrams))
+        if (collected := reports.collected_diagrams.get(None)) is not None:
+            collected.extend(diagrams)
+    return rendered
+
+
+def _render_report(
+    template_id: str,
+    model_element_uuid: str,
+    cancellation: executors.RenderCancellation,
+) -> tuple[str, list[tuple[str, str, str]]]:
+    template = reports.template_by_id(template_id)
+    assert template is not None
+    model_element = (
+        state.model.by_uuid(model_element_uuid) if model_element_uuid else None
+    )
+    diagrams: list[tuple[str, str, str]] = []
+    diagrams_token = reports.collected_diagrams.set(diagrams)
+    cancellation_token = reports.render_cancellation.set(cancellation)
+    memo_token = reports.render_memo.set(reports.RenderMemo())
+    try:
+        rendered = template.load_jinja_template().render(
+            object=model_element,
+            model=state.model,
+            diff_data={},
+            object_diff={},
+        )
+    finally:
+        reports.render_memo.reset(memo_token)
+        reports.render_cancellation.reset(cancellation_token)
+        reports.collected_diagrams.reset(diagrams_token)
+    return rendered, diagrams
+
 
 @ar.get("/report/{template_id}")
 @ar.get("/report/{template_id}/{model_element_uuid}")
@@ -306,43 +971,255 @@ def render_template(
 
 
 @ar.get("/diagram/{parent}/{attr}")
-def render_diagram(
+async def render_diagram(
+    request: starlette.requests.Request,
     parent: str,
     attr: str,
     params: str = "",
 ) -> t.Any:
     """Request the rendering of a diagram."""
-    if params:
-        dec_params = json.loads(params)
-    else:
-        dec_params = {}
-    del params
+    etag = _make_etag(diagram_cache_key(parent, attr, params))
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
 
     try:
-        parent_obj = state.model.by_uuid(parent)
-    except KeyError:
-        return ft.Div(f"Model element not found: {parent}")
+        rendered = await diagram_flights.run(
+            f"html\0{diagram_cache_key(parent, attr, params)}",
+            diagram_executor.run,
+            _render_diagram_html,
+            parent,
+            attr,
+            params,
+        )
+    except LookupError as err:
+        return ft.Div(str(err))
+    except Exception:
+        return fh.NotStr(_diagram_error_markup(parent, attr))
+
+    return (
+        fh.NotStr(rendered),
+        *_cache_headers(etag),
+    )
+
+
+@ar.get("/report-diagrams")
+async def report_diagrams(
+    template_id: str, model_element_uuid: str = ""
+) -> t.Any:
+    """Stream the diagrams of a rendered report as server-sent events.
+
+    The diagrams are rendered concurrently, and each is sent as a
+    ``diagram`` event as soon as it is done. The final ``done`` event
+    tells the client to request any diagrams that were not part of the
+    stream individually.
+    """
+    diagrams: list[tuple[str, str, str]] = []
+    if (template := reports.template_by_id(template_id)) is not None:
+        cache_key = report_cache_key(template, model_element_uuid)
+        if known := state.render_cache.get(f"{cache_key}\0diagrams"):
+            diagrams = [tuple(i) for i in json.loads(known)]
+    return starlette.responses.StreamingResponse(
+        _stream_diagrams(diagrams),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+def _diagram_stream_url(template_id: str, model_element_uuid: str) -> str:
+    if not c.DIAGRAM_STREAM:
+        return ""
+    return report_diagrams.to(
+        template_id=template_id, model_element_uuid=model_element_uuid
+    )
+
+
+async def _stream_diagrams(
+    diagrams: list[tuple[str, str, str]],
+) -> cabc.AsyncIterator[str]:
+    tasks = [
+        asyncio.create_task(_diagram_event(*i))
+        for i in dict.fromkeys(diagrams)
+    ]
     try:
-        diag = getattr(parent_obj, attr)
-    except AttributeError:
-        return ft.Div(f"Model element does not have attribute {attr!r}")
-    if not isinstance(diag, capellambse.model.AbstractDiagram):
-        return ft.Div(f"Attribute {attr!r} is not a diagram")
+        for event in asyncio.as_completed(tasks):
+            yield await event
+        yield "event: done\ndata:\n\n"
+    finally:
+        for task in tasks:
+            task.cancel()
 
+
+async def _diagram_event(parent: str, attr: str, params: str) -> str:
     try:
-        rendered = reports.render_diagram(
-            diag.render("svg", **dec_params), diag.name
+        html = await diagram_flights.run(
+            f"html\0{diagram_cache_key(parent, attr, params)}",
+            diagram_executor.run,
+            _render_diagram_html,
+            parent,
+            attr,
+            params,
         )
+    except LookupError as err:
+        html = fh.to_xml(ft.Div(str(err)))
+    except Exception:
+        html = _diagram_error_markup(parent, attr)
+    data = json.dumps(
+        {"id": reports.diagram_element_id(parent, attr, params), "html": html}
+    )
+    return f"event: diagram\ndata: {data}\n\n"
+
+
+@ar.get("/diagram-image/{parent}/{attr}")
+async def diagram_image(
+    request: starlette.requests.Request,
+    parent: str,
+    attr: str,
+    params: str = "",
+    v: str = "",
+) -> t.Any:
+    """Get a rendered diagram as SVG image.
+
+    Links to this endpoint carry the diagram's current ETag in ``v``,
+    which makes the URL immutable as long as that ETag is current.
+    """
+    etag = _make_etag(diagram_cache_key(parent, attr, params))
+    headers = {i.k: i.v for i in _cache_headers(etag)}
+    if v and v == etag.strip('"'):
+        headers["Cache-Control"] = f"max-age={IMMUTABLE_MAX_AGE}, immutable"
+    if _etag_matches(request, etag):
+        return starlette.responses.Response(status_code=304, headers=headers)
+
+    try:
+        svg = await diagram_flights.run(
+            f"svg\0{diagram_cache_key(parent, attr, params)}",
+            diagram_executor.run,
+            render_diagram_svg,
+            parent,
+            attr,
+            params,
+        )
+    except LookupError as err:
+        return starlette.responses.PlainTextResponse(str(err), 404)
     except Exception:
         logger.exception("Error rendering diagram %r on %r", attr, parent)
-        full_traceback = traceback.format_exc()
-        rendered = reports.SVG_ERROR_MARKUP.format(traceback=full_traceback)
+        return starlette.responses.PlainTextResponse(
+            "Error rendering diagram", 500
+        )
+    # Keep scripts in the SVG from running when it is opened directly
+    headers["Content-Security-Policy"] = SVG_CONTENT_SECURITY_POLICY
+    return starlette.responses.Response(
+        svg, media_type="image/svg+xml", headers=headers
+    )
 
-    return (
-        fh.NotStr(rendered),
-        fh.HttpHeader("Cache-Control", f"max-age={c.CACHE_MAX_AGE}"),
-        fh.HttpHeader("Vary", "Render-Environment"),
+
+def diagram_image_url(parent: str, attr: str, params: str) -> str:
+    """Build the immutable URL of a diagram's SVG image."""
+    etag = _make_etag(diagram_cache_key(parent, attr, params))
+    query = {"params": params} if params else {}
+    query["v"] = etag.strip('"')
+    url = app.url_path_for("diagram_image", parent=parent, attr=attr)
+    return f"{url}?{urllib.parse.urlencode(query)}"
+
+
+def render_diagram_markup(parent: str, attr: str, params: str) -> str:
+    """Render a diagram for embedding into a report.
+
+    Errors during rendering are returned as error markup, while a missing
+    parent element or diagram raises a LookupError.
+    """
+    try:
+        return _render_diagram_html(parent, attr, params)
+    except LookupError:
+        raise
+    except Exception:
+        return _diagram_error_markup(parent, attr)
+
+
+def _render_diagram_html(parent: str, attr: str, params: str) -> str:
+    # Render now, so that errors can be shown in place of the diagram,
+    # and the browser's image request is answered from the cache
+    render_diagram_svg(parent, attr, params)
+    return reports.SVG_WRAP_MARKUP.format(
+        svg_data=diagram_image_url(parent, attr, params),
+        title=_find_diagram(parent, attr).name,
     )
 
 
+def render_diagram_svg(parent: str, attr: str, params: str) -> str:
+    """Render a diagram to SVG, or get it from the diagram cache.
+
+    Successfully rendered diagrams are kept in the diagram cache, which
+    is shared by all workers and survives restarts.
+    """
+    cache_key = diagram_cache_key(parent, attr, params)
+    svg = state.diagram_cache.get(cache_key)
+    if svg is not None:
+        return svg
+
+    diag = _find_diagram(parent, attr)
+    started = time.perf_counter()
+    svg = render_farm.call(_render_diagram, parent, attr, params)
+    _observe_diagram_render(
+        diag,
+        parent,
+        attr,
+        time.perf_counter() - started,
+        len(svg.encode("utf-8")),
+    )
+
+    state.diagram_cache.put(cache_key, svg)
+    return svg
+
+
+def _diagram_error_markup(parent: str, attr: str) -> str:
+    logger.exception("Error rendering diagram %r on %r", attr, parent)
+    full_traceback = traceback.format_exc()
+    return reports.SVG_ERROR_MARKUP.format(traceback=full_traceback)
+
+
+def diagram_cache_key(parent: str, attr: str, params: str) -> str:
+    """Compute the render cache key for a diagram.
+
+    Equivalent render parameters result in the same key, regardless of
+    their order and formatting.
+    """
+    with contextlib.suppress(ValueError):
+        params = json.dumps(
+            json.loads(params), separators=(",", ":"), sort_keys=True
+        )
+    return f"{reports.compute_cache_key(None)}\0{parent}\0{attr}\0{params}"
+
+
+def _find_diagram(parent: str, attr: str) -> capellambse.model.AbstractDiagram:
+    try:
+        parent_obj = state.model.by_uuid(parent)
+    except KeyError:
+        raise LookupError(f"Model element not found: {parent}") from None
+    try:
+        diag = getattr(parent_obj, attr)
+    except AttributeError:
+        raise LookupError(
+            f"Model element does not have attribute {attr!r}"
+        ) from None
+    if not isinstance(diag, capellambse.model.AbstractDiagram):
+        raise LookupError(f"Attribute {attr!r} is not a diagram")
+    return diag
+
+
+def _render_diagram(parent: str, attr: str, params: str) -> str:
+    if params:
+        dec_params = json.loads(params)
+    else:
+        dec_params = {}
+    del params
+
+    diag = _find_diagram(parent, attr)
+    return diag.render("svg", **dec_params)
+
+
 ar.to_app(app)
+core.record_startup_phase(
+    "imports",
+    time.perf_counter() - capella_model_explorer.IMPORT_STARTED,
+    log=False,
+)
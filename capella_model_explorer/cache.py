@@ -0,0 +1,211 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Server-side caches for rendered reports and diagrams.
+
+Rendered content is kept in a size-bounded in-memory LRU cache, and
+optionally in a directory on disk, which survives restarts and is shared
+between worker processes. Entries are keyed by the render environment
+(see :func:`~capella_model_explorer.reports.compute_cache_key`) and the
+model element, so that a changed model, template or application version
+never serves stale content.
+"""
+
+from __future__ import annotations
+
+__all__ = ["RenderCache"]
+
+import collections
+import contextlib
+import hashlib
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+
+import prometheus_client
+
+logger = logging.getLogger(__name__)
+
+DISK_EVICTION_TARGET = 0.9
+"""Fraction of the maximum disk size to shrink the disk tier to."""
+
+render_cache_hits = prometheus_client.Counter(
+    "render_cache_hits",
+    "Number of renders served from the render cache",
+    ["cache", "tier"],
+)
+render_cache_misses = prometheus_client.Counter(
+    "render_cache_misses",
+    "Number of renders that were not found in the render cache",
+    ["cache"],
+)
+render_cache_memory_bytes = prometheus_client.Gauge(
+    "render_cache_memory_bytes",
+    "Size of the renders held in the in-memory render cache",
+    ["cache"],
+    multiprocess_mode="livesum",
+)
+render_cache_disk_evictions = prometheus_client.Counter(
+    "render_cache_disk_evictions",
+    "Number of entries evicted from the disk tier of the render cache",
+    ["cache"],
+)
+
+
+class RenderCache:
+    """A two-tier cache mapping string keys to rendered content.
+
+    Parameters
+    ----------
+    name
+        Name of the cache, used for metric labels.
+    max_size
+        Maximum total size of the in-memory tier in bytes. Least
+        recently used entries are evicted first. Entries larger than
+        this are never held in memory.
+    directory
+        Directory for the disk tier, or None to disable it.
+    max_disk_size
+        Maximum total size of the disk tier in bytes, or None for no
+        limit. When it is exceeded, the least recently used files are
+        deleted, which works across processes sharing the directory.
+    suffix
+        File name suffix for entries in the disk tier.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_size: int,
+        directory: pathlib.Path | None = None,
+        max_disk_size: int | None = None,
+        suffix: str = ".html",
+    ) -> None:
+        self.name = name
+        self.max_size = max_size
+        self.directory = directory
+        self.max_disk_size = max_disk_size
+        self.suffix = suffix
+        self._entries: collections.OrderedDict[str, tuple[str, int]] = (
+            collections.OrderedDict()
+        )
+        self._size = 0
+        self._disk_size: int | None = None
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        """Look up a rendered entry, or return None if it is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            render_cache_hits.labels(self.name, "memory").inc()
+            return entry[0]
+
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                value = path.read_text(encoding="utf8")
+            except FileNotFoundError:
+                pass
+            except OSError as err:
+                logger.warning("Cannot read render cache entry: %s", err)
+            else:
+                render_cache_hits.labels(self.name, "disk").inc()
+                if self.max_disk_size is not None:
+                    # Keep the modification time as last use for eviction
+                    with contextlib.suppress(OSError):
+                        os.utime(path)
+                self._remember(key, value)
+                return value
+
+        render_cache_misses.labels(self.name).inc()
+        return None
+
+    def put(self, key: str, value: str) -> None:
+        """Store a rendered entry in all enabled tiers."""
+        data = value.encode("utf-8")
+        self._remember(key, value, len(data))
+        if self.directory is None:
+            return
+
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(prefix=".tmp-", dir=path.parent)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmpname, path)
+        except OSError as err:
+            logger.warning("Cannot write render cache entry: %s", err)
+            return
+        if self.max_disk_size is not None:
+            self._account_disk_size(len(data))
+
+    def _remember(self, key: str, value: str, size: int | None = None) -> None:
+        if size is None:
+            size = len(value.encode("utf-8"))
+        if size > self.max_size:
+            return
+        with self._lock:
+            if (old := self._entries.pop(key, None)) is not None:
+                self._size -= old[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+            render_cache_memory_bytes.labels(self.name).set(self._size)
+
+    def _account_disk_size(self, size: int) -> None:
+        assert self.max_disk_size is not None
+        with self._lock:
+            # Other processes write to the same directory, so the size is
+            # only an estimate until the next eviction scans the files.
+            if self._disk_size is None:
+                self._disk_size = sum(i[1] for i in self._disk_entries())
+            self._disk_size += size
+            if self._disk_size > self.max_disk_size:
+                self._disk_size = self._evict_from_disk()
+
+    def _evict_from_disk(self) -> int:
+        assert self.max_disk_size is not None
+        entries = sorted(self._disk_entries())
+        total = sum(i[1] for i in entries)
+        target = self.max_disk_size * DISK_EVICTION_TARGET
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                path.unlink()
+            total -= size
+            evicted += 1
+        render_cache_disk_evictions.labels(self.name).inc(evicted)
+        logger.debug(
+            "Evicted %d entries from the %s cache directory",
+            evicted,
+            self.name,
+        )
+        return total
+
+    def _disk_entries(self) -> list[tuple[float, int, pathlib.Path]]:
+        assert self.directory is not None
+        entries = []
+        for path in self.directory.glob(f"??/*{self.suffix}"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _path(self, key: str) -> pathlib.Path:
+        assert self.directory is not None
+        digest = hashlib.blake2b(
+            key.encode("utf-8"), digest_size=20, usedforsecurity=False
+        ).hexdigest()
+        return self.directory / digest[:2] / f"{digest[2:]}{self.suffix}"
@@ -135,6 +135,35 @@ def breadcrumbs(
     )
 
 
+def loading_page() -> ft.Main:
+    """Render a placeholder page that is shown while loading the model."""
+    return ft.Main(
+        ft.Div(
+            icons.spinner(),
+            ft.P("Loading the model, please wait..."),
+            cls=(
+                "dark:text-neutral-400",
+                "flex",
+                "flex-col",
+                "items-center",
+                "space-y-4",
+                "text-neutral-700",
+            ),
+        ),
+        ft.Script("setTimeout(() => window.location.reload(), 3000);"),
+        id="root",
+        cls=(
+            "bg-neutral-100",
+            "dark:bg-neutral-900",
+            "flex",
+            "h-screen",
+            "items-center",
+            "justify-center",
+            "w-full",
+        ),
+    )
+
+
 def model_information() -> ft.Div:
     """Render the model information including the badge."""
     badge = "data:image/svg+xml;base64," + base64.standard_b64encode(
@@ -304,16 +333,30 @@ def report_placeholder(
     else:
         render_environment = reports.compute_cache_key(template)
         headers = json.dumps({"Render-Environment": render_environment})
-
+        url = app.rendered_report.to(
+            template_id=template.id,
+            model_element_uuid=model_element_uuid,
+        )
+        trigger = "click" if c.DEBUG_SPINNER else "load"
+
+        if c.STREAM_DOCUMENTS and template.isDocument:
+            # Shown while it is being received, see frontend/app.js
+            request = {
+                "data_report_stream": url,
+                "data_report_headers": headers,
+                "data_report_target": "#template_container",
+                "data_report_trigger": trigger,
+            }
+        else:
+            request = {
+                "hx_get": url,
+                "hx_headers": headers,
+                "hx_target": "#template_container",
+                "hx_trigger": trigger,
+            }
         ph_content = ft.Div(
             icons.spinner(),
-            hx_trigger="click" if c.DEBUG_SPINNER else "load",
-            hx_get=app.rendered_report.to(
-                template_id=template.id,
-                model_element_uuid=model_element_uuid,
-            ),
-            hx_headers=headers,
-            hx_target="#template_container",
+            **request,
             cls="flex justify-center place-items-center h-full w-full",
         )
 
@@ -398,6 +441,7 @@ def search_field(template: reports.Template, search: str) -> ft.Div:
 
 def template_card(template: reports.Template) -> ft.A:
     url = app.app.url_path_for("template_page", template_id=template.id)
+    instance_count = template.known_instance_count
 
     chips = []
     if template.isExperimental:
@@ -493,11 +537,15 @@ def template_card(template: reports.Template) -> ft.A:
             ),
             ft.Div(
                 icons.file_stack()
-                if template.instance_count > 1
+                if instance_count is None or instance_count > 1
                 else icons.report(),
                 ft.Span(
-                    template.instance_count,
-                    cls="hidden" if template.instance_count <= 1 else "block",
+                    instance_count,
+                    cls=(
+                        "hidden"
+                        if instance_count is None or instance_count <= 1
+                        else "block"
+                    ),
                 ),
                 cls=(
                     "dark:text-neutral-400",
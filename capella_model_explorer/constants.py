@@ -30,27 +30,89 @@ CACHE_MAX_AGE = 365 * 24 * 60 * 60  # 1 year
 CONFIG = fasthtml.starlette.Config(env_prefix="CME_")
 
 
+def fraction(value: str | float) -> float:
+    """Convert a config value to a number greater than 0 and at most 1."""
+    result = float(value)
+    if not 0 < result <= 1:
+        raise ValueError(f"{result} is not greater than 0 and at most 1")
+    return result
+
+
 @dataclasses.dataclass
 class Defaults:
+    cache_dir: t.Final[pathlib.Path] = pathlib.Path(
+        "~/.cache/capella-model-explorer"
+    )
+    diagram_cache_size: t.Final[int] = 1024
+    diagram_memory_cache_size: t.Final[int] = 64
+    diagram_stream: t.Final[bool] = True
+    diagram_threads: t.Final[int] = 4
     docker_image_name: t.Final[str] = "capella-model-explorer:latest"
     host: t.Final[str] = "0.0.0.0"
+    layout_memory_cache_size: t.Final[int] = 16
+    lazy_instances: t.Final[bool] = False
     live_mode: bool = True
     model: t.Final[str] = (
         "git+https://github.com/DSD-DBS/Capella-IFE-sample.git"
     )
+    model_snapshot: t.Final[bool] = True
     port: t.Final[int] = 8000
     primary_color_hue: t.Final[int] = 231
+    render_cache_disk: t.Final[bool] = False
+    render_cache_size: t.Final[int] = 64
+    render_processes: t.Final[int] = 0
+    render_timeout: t.Final[float] = 120
+    report_threads: t.Final[int] = 2
     route_prefix: t.Final[str] = ""
+    slow_render_threshold: t.Final[float] = 5
+    stream_documents: t.Final[bool] = False
+    template_workers: t.Final[int] = 0
     templates_dir: t.Final[pathlib.Path] = pathlib.Path("templates")
+    warmup: t.Final[bool] = False
+    warmup_budget: t.Final[float] = 0.25
+    warmup_templates: t.Final[str] = ""
+    workers: t.Final[int] = 1
 
 
+CACHE_DIR: t.Final[pathlib.Path] = CONFIG(
+    "CACHE_DIR", cast=pathlib.Path, default=Defaults.cache_dir
+).expanduser()
 DEBUG_SPINNER = CONFIG("DEBUG_SPINNER", cast=bool, default=False)
 
+DIAGRAM_CACHE_SIZE: t.Final[int] = CONFIG(
+    "DIAGRAM_CACHE_SIZE", cast=int, default=Defaults.diagram_cache_size
+)
+"""Size of the on-disk diagram and layout caches in MiB each."""
+DIAGRAM_MEMORY_CACHE_SIZE: t.Final[int] = CONFIG(
+    "DIAGRAM_MEMORY_CACHE_SIZE",
+    cast=int,
+    default=Defaults.diagram_memory_cache_size,
+)
+"""Size of the in-memory cache for rendered diagrams in MiB."""
+DIAGRAM_STREAM: t.Final[bool] = CONFIG(
+    "DIAGRAM_STREAM", cast=bool, default=Defaults.diagram_stream
+)
+"""Whether to deliver a report's diagrams in a single event stream."""
+DIAGRAM_THREADS: t.Final[int] = CONFIG(
+    "DIAGRAM_THREADS", cast=int, default=Defaults.diagram_threads
+)
 DOCKER_IMAGE_NAME: str = CONFIG(
     "DOCKER_IMAGE_NAME", default=Defaults.docker_image_name
 )
 HOST: str = CONFIG("HOST", default=Defaults.host)
+LAYOUT_MEMORY_CACHE_SIZE: t.Final[int] = CONFIG(
+    "LAYOUT_MEMORY_CACHE_SIZE",
+    cast=int,
+    default=Defaults.layout_memory_cache_size,
+)
+"""Size of the in-memory cache for diagram layouts in MiB."""
+LAZY_INSTANCES: t.Final[bool] = CONFIG(
+    "LAZY_INSTANCES", cast=bool, default=Defaults.lazy_instances
+)
 MODEL: str = CONFIG("MODEL", default=Defaults.model)
+MODEL_SNAPSHOT: t.Final[bool] = CONFIG(
+    "MODEL_SNAPSHOT", cast=bool, default=Defaults.model_snapshot
+)
 PORT: int = CONFIG("PORT", cast=int, default=Defaults.port)
 PRIMARY_COLOR_HUE: int = CONFIG(
     "PRIMARY_COLOR_HUE", cast=int, default=Defaults.primary_color_hue
@@ -58,24 +120,64 @@ PRIMARY_COLOR_HUE: int = CONFIG(
 LIVE_MODE: t.Final[bool] = CONFIG(
     "LIVE_MODE", cast=bool, default=Defaults.live_mode
 )
+RENDER_CACHE_DISK: t.Final[bool] = CONFIG(
+    "RENDER_CACHE_DISK", cast=bool, default=Defaults.render_cache_disk
+)
+RENDER_CACHE_SIZE: t.Final[int] = CONFIG(
+    "RENDER_CACHE_SIZE", cast=int, default=Defaults.render_cache_size
+)
+"""Size of the in-memory cache for rendered reports in MiB."""
+RENDER_PROCESSES: t.Final[int] = CONFIG(
+    "RENDER_PROCESSES", cast=int, default=Defaults.render_processes
+)
+RENDER_TIMEOUT: t.Final[float] = CONFIG(
+    "RENDER_TIMEOUT", cast=float, default=Defaults.render_timeout
+)
+"""Default time in seconds after which rendering a report is aborted."""
+REPORT_THREADS: t.Final[int] = CONFIG(
+    "REPORT_THREADS", cast=int, default=Defaults.report_threads
+)
 
 ROUTE_PREFIX: t.Final[str] = CONFIG(
     "ROUTE_PREFIX", default=Defaults.route_prefix
 ).rstrip("/")
+SLOW_RENDER_THRESHOLD: t.Final[float] = CONFIG(
+    "SLOW_RENDER_THRESHOLD", cast=float, default=Defaults.slow_render_threshold
+)
+"""Time in seconds after which a render is logged as slow."""
+STREAM_DOCUMENTS: t.Final[bool] = CONFIG(
+    "STREAM_DOCUMENTS", cast=bool, default=Defaults.stream_documents
+)
+TEMPLATE_WORKERS: t.Final[int] = CONFIG(
+    "TEMPLATE_WORKERS", cast=int, default=Defaults.template_workers
+)
 TEMPLATES_DIR: t.Final[pathlib.Path] = CONFIG(
     "TEMPLATES_DIR",
     cast=pathlib.Path,
     default=Defaults.templates_dir.resolve(),
 ).resolve()
+WARMUP: t.Final[bool] = CONFIG("WARMUP", cast=bool, default=Defaults.warmup)
+WARMUP_BUDGET: t.Final[float] = CONFIG(
+    "WARMUP_BUDGET", cast=fraction, default=Defaults.warmup_budget
+)
+"""Maximum fraction of time the background warm-up may be busy."""
+WARMUP_TEMPLATES: t.Final[frozenset[str]] = frozenset(
+    i.strip()
+    for i in CONFIG(
+        "WARMUP_TEMPLATES", default=Defaults.warmup_templates
+    ).split(",")
+    if i.strip()
+)
+"""IDs of templates to warm up. If empty, all stable templates are used."""
+WORKERS: t.Final[int] = CONFIG("WORKERS", cast=int, default=Defaults.workers)
 
 css_bundle_path = "static/bundle/app.css"
-css_bundle_hash = core.compute_file_hash(css_bundle_path)
-
 favicon_path = "static/favicon.svg"
-favicon_hash = core.compute_file_hash(favicon_path)
-
 js_bundle_path = "static/bundle/app.js"
-js_bundle_hash = core.compute_file_hash(js_bundle_path)
+with core.timed_startup_phase("assets", log=False):
+    css_bundle_hash = core.compute_file_hash(css_bundle_path)
+    favicon_hash = core.compute_file_hash(favicon_path)
+    js_bundle_hash = core.compute_file_hash(js_bundle_path)
 
 HEADERS: t.Final[list[fh.Link | ft.Script]] = [
     fh.Link(
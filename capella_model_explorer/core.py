@@ -4,26 +4,82 @@
 from __future__ import annotations
 
 import base64
+import collections.abc as cabc
 import contextlib
 import copy
 import hashlib
 import logging
-import pathlib
+import os
+import time
 
 import logfmter
 
 ACCESS_LOGGER = "uvicorn.access"
 
+logger = logging.getLogger(__name__)
+
+startup_times: dict[str, float] = {}
+"""Duration in seconds of each startup phase of the last launch."""
+_file_hashes: dict[str, tuple[tuple[int, int, int], str]] = {}
+
+
+def record_startup_phase(
+    phase: str, seconds: float, *, log: bool = True
+) -> None:
+    """Record the duration of a startup phase.
+
+    Phases that run at import time, before logging is configured, should
+    pass ``log=False`` and be logged later with :func:`log_startup_phase`.
+    """
+    startup_times[phase] = seconds
+    if log:
+        log_startup_phase(phase)
+
+
+def log_startup_phase(phase: str) -> None:
+    seconds = startup_times[phase]
+    logger.info(
+        "Startup phase %r took %.3fs",
+        phase,
+        seconds,
+        extra={"phase": phase, "seconds": round(seconds, 3)},
+    )
+
+
+@contextlib.contextmanager
+def timed_startup_phase(
+    phase: str, *, log: bool = True
+) -> cabc.Iterator[None]:
+    """Measure the duration of the wrapped startup phase."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_startup_phase(phase, time.perf_counter() - start, log=log)
+
 
 def compute_file_hash(file_path: str):
-    """Compute a hash for the given file."""
-    if not pathlib.Path(file_path).exists():
+    """Compute a hash for the given file.
+
+    Hashes are remembered until the file's modification time, inode or
+    size change, so that repeated calls only cost a ``stat``.
+    """
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
         return ""
+    signature = (st.st_mtime_ns, st.st_ino, st.st_size)
+    known = _file_hashes.get(file_path)
+    if known is not None and known[0] == signature:
+        return known[1]
+
     hasher = hashlib.blake2b(digest_size=9, usedforsecurity=False)
     with open(file_path, "rb") as f:
         buf = f.read()
         hasher.update(buf)
-    return base64.urlsafe_b64encode(hasher.digest()).decode("utf-8")
+    digest = base64.urlsafe_b64encode(hasher.digest()).decode("utf-8")
+    _file_hashes[file_path] = (signature, digest)
+    return digest
 
 
 class Logfmter(logfmter.Logfmter):
@@ -0,0 +1,470 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Dedicated executors for CPU-heavy rendering work.
+
+Sync request handlers run in the event loop's shared thread pool. If
+slow renders are dispatched there too, they can use up all of its
+threads, and cheap requests like the model element list have to wait.
+Each class of rendering work therefore gets its own executor with a
+bounded number of threads, and requests beyond that wait in its queue.
+
+Optionally, the actual rendering is handed off from these threads to a
+:class:`RenderFarm` of forked processes, to make use of multiple cores.
+Identical renders requested at the same time are only run once, see
+:class:`SingleFlight`.
+"""
+
+from __future__ import annotations
+
+__all__ = [
+    "RenderCancellation",
+    "RenderCancelled",
+    "RenderExecutor",
+    "RenderFarm",
+    "SingleFlight",
+    "cancellation_requested",
+]
+
+import asyncio
+import concurrent.futures
+import concurrent.futures.process
+import contextvars
+import ctypes
+import logging
+import multiprocessing
+import multiprocessing.sharedctypes
+import os
+import queue
+import threading
+import time
+import typing as t
+
+import prometheus_client
+import prometheus_client.multiprocess
+
+logger = logging.getLogger(__name__)
+
+_T = t.TypeVar("_T")
+_P = t.ParamSpec("_P")
+
+render_queue_depth = prometheus_client.Gauge(
+    "render_queue_depth",
+    "Number of renders waiting for a free rendering thread",
+    ["executor"],
+    multiprocess_mode="livesum",
+)
+render_queue_wait_seconds = prometheus_client.Histogram(
+    "render_queue_wait_seconds",
+    "Time renders spent waiting for a free rendering thread",
+    ["executor"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30),
+)
+render_requests_coalesced = prometheus_client.Counter(
+    "render_requests_coalesced",
+    "Number of render requests that waited for an identical render",
+    ["group"],
+)
+CANCEL_POLL_INTERVAL = 0.25
+"""Time in seconds between checks whether a render process should stop."""
+CANCEL_SLOTS = 64
+"""Number of renders per farm that can be cancelled at the same time."""
+
+_cancel_flags: contextvars.ContextVar[ctypes.Array[ctypes.c_byte] | None] = (
+    contextvars.ContextVar("cancel_flags", default=None)
+)
+"""Cancellation flags shared with the parent, in render processes."""
+_current_slot: contextvars.ContextVar[int | None] = contextvars.ContextVar(
+    "current_slot", default=None
+)
+"""Index of the current render's cancellation flag, in render processes."""
+
+render_process_crashes = prometheus_client.Counter(
+    "render_process_crashes",
+    "Number of render processes that crashed while rendering",
+)
+
+
+class RenderCancelled(Exception):
+    """Raised inside a render that is no longer needed."""
+
+
+class RenderCancellation:
+    """Allows stopping a render that is in progress.
+
+    Renders check for cancellation every time they output a value, see
+    :func:`.reports.finalize`. A cancelled render raises :class:`RenderCancelled`,
+    one that exceeded its timeout raises :class:`TimeoutError`.
+
+    When sent to a render process with
+    :meth:`RenderFarm.call_cancellable`, later cancellations still reach
+    the process.
+    """
+
+    def __init__(self, timeout: float | None) -> None:
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason: str | None = None
+
+    def cancel(self, reason: str) -> None:
+        self.reason = reason
+
+    def check(self) -> None:
+        if self.reason is not None:
+            raise RenderCancelled(self.reason)
+        if cancellation_requested():
+            raise RenderCancelled("cancelled by the server process")
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise TimeoutError(
+                f"Rendering took longer than {self.timeout} seconds"
+            )
+
+
+class RenderExecutor:
+    """A bounded thread pool for one class of rendering work.
+
+    Parameters
+    ----------
+    name
+        Name of the executor, used for thread names and metric labels.
+    max_workers
+        Maximum number of renders running at the same time.
+    in_flight
+        A shared counter of the renders that are currently running,
+        which may be shared with other executors and processes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        *,
+        in_flight: multiprocessing.sharedctypes.Synchronized[int]
+        | None = None,
+    ) -> None:
+        self.name = name
+        self.in_flight = in_flight
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"render-{name}"
+        )
+        self._queue_depth = render_queue_depth.labels(name)
+        self._queue_wait = render_queue_wait_seconds.labels(name)
+
+    async def run(
+        self, fn: t.Callable[_P, _T], /, *args: _P.args, **kw: _P.kwargs
+    ) -> _T:
+        """Run ``fn`` in this executor and wait for its result."""
+        submitted = time.perf_counter()
+        queued = True
+        lock = threading.Lock()
+        self._queue_depth.inc()
+
+        def dequeue() -> bool:
+            nonlocal queued
+            with lock:
+                was_queued, queued = queued, False
+            if was_queued:
+                self._queue_depth.dec()
+            return was_queued
+
+        def run_queued() -> _T:
+            if dequeue():
+                self._queue_wait.observe(time.perf_counter() - submitted)
+            if self.in_flight is None:
+                return fn(*args, **kw)
+            with self.in_flight.get_lock():
+                self.in_flight.value += 1
+            try:
+                return fn(*args, **kw)
+            finally:
+                with self.in_flight.get_lock():
+                    self.in_flight.value -= 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._pool, run_queued)
+        finally:
+            # In case the request was cancelled while still queued
+            dequeue()
+
+
+class RenderFarm:
+    """Run renders in a pool of forked processes that share the model.
+
+    Rendering Python templates is limited by the GIL, so threads alone
+    can't use more than one core. The farm forks its processes from the
+    fully loaded process, so that they inherit the model and templates
+    through copy-on-write memory.
+
+    Forking a process with more than one thread can leave locks held by
+    the other threads locked forever in the children. The processes are
+    therefore forked by :meth:`start`, which must be called before any
+    other threads are started. Until then, renders run directly in the
+    calling thread.
+
+    If a process crashes, the pool is replaced with a fresh one and the
+    affected renders are retried, so that a single bad template can't
+    take down the server. This is the only time that processes are
+    forked from a running server.
+
+    Parameters
+    ----------
+    processes
+        Number of render processes. With 0, renders run directly in the
+        calling thread.
+    retries
+        How often to retry a render after its process crashed.
+    """
+
+    def __init__(self, processes: int, *, retries: int = 1) -> None:
+        self.processes = processes
+        self.retries = retries
+        self._pool: concurrent.futures.ProcessPoolExecutor | None = None
+        self._pool_pid: int | None = None
+        self._lock = threading.Lock()
+        self._cancel_flags: ctypes.Array[ctypes.c_byte] | None = None
+        self._free_slots: queue.SimpleQueue[int] = queue.SimpleQueue()
+
+    def start(self) -> None:
+        """Fork the render processes.
+
+        All processes are forked right away, so this must be called
+        while the calling process has only one thread.
+        """
+        if not self.processes:
+            return
+        if threading.active_count() > 1:
+            raise RuntimeError("Cannot start render processes with threads")
+        # Forget processes inherited from a parent process
+        self._pool = None
+        self._cancel_flags = multiprocessing.RawArray("b", CANCEL_SLOTS)
+        self._free_slots = queue.SimpleQueue()
+        for slot in range(CANCEL_SLOTS):
+            self._free_slots.put(slot)
+        # With the fork start method, the first submission launches all
+        # processes before the pool starts its management thread
+        self._get_pool().submit(os.getpid).result()
+        logger.info("Started %d render processes", self.processes)
+
+    def shutdown(self) -> None:
+        """Stop the render processes, waiting for running renders."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None and self._pool_pid == os.getpid():
+            pids = _pool_pids(pool)
+            pool.shutdown(wait=True, cancel_futures=True)
+            _mark_processes_dead(pids)
+
+    def call(
+        self, fn: t.Callable[_P, _T], /, *args: _P.args, **kw: _P.kwargs
+    ) -> _T:
+        """Call ``fn`` in a render process and wait for its result.
+
+        The function and its arguments must be picklable.
+        """
+        return self.call_cancellable(None, fn, *args, **kw)
+
+    def call_cancellable(
+        self,
+        check: t.Callable[[], object] | None,
+        fn: t.Callable[_P, _T],
+        /,
+        *args: _P.args,
+        **kw: _P.kwargs,
+    ) -> _T:
+        """Call ``fn`` in a render process, unless ``check`` raises.
+
+        ``check`` is called regularly while waiting for the result. Once
+        it raises, the render is dropped if it didn't start yet, and
+        otherwise :func:`cancellation_requested` returns True in the
+        render process until the render is done. It is up to ``fn`` to
+        check for that and stop early.
+        """
+        if self._pool_pid != os.getpid():
+            return fn(*args, **kw)
+
+        for attempt in range(self.retries + 1):
+            pool = self._get_pool()
+            try:
+                slot = self._free_slots.get_nowait()
+            except queue.Empty:
+                slot = None
+            try:
+                if slot is not None:
+                    assert self._cancel_flags is not None
+                    self._cancel_flags[slot] = 0
+                future = pool.submit(_call_in_slot, slot, fn, args, kw)
+                return self._wait(future, check, slot)
+            except concurrent.futures.process.BrokenProcessPool:
+                render_process_crashes.inc()
+                logger.error(
+                    "Render process crashed while running %s%r (attempt %d)",
+                    getattr(fn, "__name__", fn),
+                    args,
+                    attempt + 1,
+                )
+                self._discard_pool(pool)
+            finally:
+                if slot is not None:
+                    self._free_slots.put(slot)
+        raise RuntimeError(
+            f"Render process crashed {self.retries + 1} times, giving up"
+        )
+
+    def _wait(
+        self,
+        future: concurrent.futures.Future[_T],
+        check: t.Callable[[], object] | None,
+        slot: int | None,
+    ) -> _T:
+        if check is None:
+            return future.result()
+        while True:
+            try:
+                return future.result(timeout=CANCEL_POLL_INTERVAL)
+            except concurrent.futures.TimeoutError:
+                pass
+            try:
+                check()
+            except BaseException:
+                if future.cancel():
+                    raise
+                if slot is not None:
+                    assert self._cancel_flags is not None
+                    self._cancel_flags[slot] = 1
+                # Wait for the render process to notice
+                return future.result()
+
+    def _get_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self._lock:
+            # Only replaces pools that were discarded after a crash
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("fork"),
+                    initializer=_init_render_process,
+                    initargs=(self._cancel_flags,),
+                )
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _discard_pool(
+        self, pool: concurrent.futures.ProcessPoolExecutor
+    ) -> None:
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pids = _pool_pids(pool)
+        pool.shutdown(wait=False, cancel_futures=True)
+        _mark_processes_dead(pids)
+
+
+def _pool_pids(pool: concurrent.futures.ProcessPoolExecutor) -> list[int]:
+    # The executor doesn't expose its processes otherwise
+    return list(pool._processes or ())  # type: ignore[attr-defined]
+
+
+def _mark_processes_dead(pids: list[int]) -> None:
+    """Remove the live gauges of stopped processes from the metrics.
+
+    This is only necessary in Prometheus' multiprocess mode, where each
+    process writes its metrics to files that outlive it.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return
+    for pid in pids:
+        prometheus_client.multiprocess.mark_process_dead(pid)
+
+
+def cancellation_requested() -> bool:
+    """Check whether the current render in a render process was cancelled.
+
+    This is always False outside of render processes.
+    """
+    flags = _cancel_flags.get()
+    slot = _current_slot.get()
+    return flags is not None and slot is not None and bool(flags[slot])
+
+
+def _init_render_process(
+    cancel_flags: ctypes.Array[ctypes.c_byte] | None,
+) -> None:
+    _cancel_flags.set(cancel_flags)
+
+
+def _call_in_slot(
+    slot: int | None,
+    fn: t.Callable[..., _T],
+    args: tuple[t.Any, ...],
+    kw: dict[str, t.Any],
+) -> _T:
+    token = _current_slot.set(slot)
+    try:
+        return fn(*args, **kw)
+    finally:
+        _current_slot.reset(token)
+
+
+class SingleFlight:
+    """Coalesce identical renders that are requested at the same time.
+
+    The first request for a key starts the render, and later requests
+    for the same key wait for its result instead of rendering again.
+    Once the render is done, the key is forgotten, so that results are
+    never reused beyond that; caching them is up to the caller.
+
+    Parameters
+    ----------
+    name
+        Name of the group of renders, used for metric labels.
+    retry_on
+        Exceptions that only concern the first request, such as it being
+        cancelled by its client. If the render fails with one of them,
+        the waiting requests start over instead of failing too.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        retry_on: tuple[type[BaseException], ...] = (),
+    ) -> None:
+        self.name = name
+        self.retry_on = retry_on
+        self._flights: dict[str, asyncio.Future[t.Any]] = {}
+        self._coalesced = render_requests_coalesced.labels(name)
+
+    async def run(
+        self,
+        key: str,
+        fn: t.Callable[_P, t.Awaitable[_T]],
+        /,
+        *args: _P.args,
+        **kw: _P.kwargs,
+    ) -> _T:
+        """Await ``fn``, or the result of an identical ongoing call."""
+        while (flight := self._flights.get(key)) is not None:
+            self._coalesced.inc()
+            await asyncio.wait([flight])
+            if flight.cancelled():
+                continue
+            if (err := flight.exception()) is None:
+                return flight.result()
+            if not isinstance(err, self.retry_on):
+                raise err
+
+        flight = asyncio.get_running_loop().create_future()
+        # Don't warn about exceptions if nobody else was waiting for them
+        flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._flights[key] = flight
+        try:
+            result = await fn(*args, **kw)
+        except BaseException as err:
+            del self._flights[key]
+            if isinstance(err, asyncio.CancelledError):
+                flight.cancel()
+            else:
+                flight.set_exception(err)
+            raise
+        del self._flights[key]
+        flight.set_result(result)
+        return result
@@ -0,0 +1,372 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Export all reports of a model as a static website.
+
+Every template is rendered for each of its instances, in a pool of
+processes that are forked after loading the model. The reports are
+written as plain HTML files, with links between reports rewritten to
+relative paths, and the diagrams they embed are written as SVG files.
+
+Exports are incremental: A manifest in the output directory records the
+render environment each file was produced with (see
+:func:`~capella_model_explorer.reports.compute_cache_key`). On the next
+export into the same directory, files whose environment did not change
+are skipped, and files are only rewritten if their content changed.
+
+The render environment includes the revision of the model, which is the
+commit hash for Git-backed models and a hash of the model files for
+models in local directories. Models without a known revision, like those
+loaded from other remote sources, are exported from scratch every time.
+"""
+
+from __future__ import annotations
+
+__all__ = ["export"]
+
+import concurrent.futures
+import dataclasses
+import json
+import logging
+import multiprocessing
+import pathlib
+import shutil
+import time
+import typing as t
+
+from fasthtml import common as fh
+from fasthtml import ft
+
+import capella_model_explorer.constants as c
+from capella_model_explorer import app, executors, reports, state
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".cme-export.json"
+PROGRESS_INTERVAL = 5.0
+"""Time in seconds between progress reports."""
+
+
+@dataclasses.dataclass
+class _Progress:
+    total: int
+    started: float = dataclasses.field(default_factory=time.perf_counter)
+    reports_done: int = 0
+    reports_skipped: int = 0
+    reports_failed: int = 0
+    diagrams_queued: int = 0
+    diagrams_done: int = 0
+    diagrams_skipped: int = 0
+    diagrams_failed: int = 0
+    last_report: float = dataclasses.field(default_factory=time.perf_counter)
+
+    def report(self, *, force: bool = False) -> None:
+        now = time.perf_counter()
+        if not force and now - self.last_report < PROGRESS_INTERVAL:
+            return
+        self.last_report = now
+
+        elapsed = now - self.started
+        rate = self.reports_done / elapsed if elapsed else 0.0
+        if rate and self.reports_done < self.total:
+            eta = _format_duration((self.total - self.reports_done) / rate)
+        else:
+            eta = "-"
+        logger.info(
+            "Exported %d/%d reports (%d skipped, %d failed), %.1f/s, ETA %s;"
+            " %d/%d diagrams (%d skipped, %d failed)",
+            self.reports_done,
+            self.total,
+            self.reports_skipped,
+            self.reports_failed,
+            rate,
+            eta,
+            self.diagrams_done,
+            self.diagrams_queued,
+            self.diagrams_skipped,
+            self.diagrams_failed,
+            extra={
+                "reports_done": self.reports_done,
+                "reports_total": self.total,
+                "reports_per_second": round(rate, 2),
+                "diagrams_done": self.diagrams_done,
+            },
+        )
+
+
+def export(output_dir: pathlib.Path, *, processes: int) -> None:
+    """Load the model and export all reports into ``output_dir``.
+
+    Parameters
+    ----------
+    output_dir
+        The directory to write the static website to.
+    processes
+        Number of processes rendering reports and diagrams.
+    """
+    app.load()
+    if not state.ready.is_set():
+        raise SystemExit("Cannot load the model, exiting")
+    state.static_export = True
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+    old_manifest = _read_manifest(manifest_path)
+    manifest: dict[str, dict[str, t.Any]] = {"reports": {}, "diagrams": {}}
+
+    jobs: list[tuple[str, str, str]] = []
+    for template in state.templates:
+        if template.single:
+            jobs.append((template.id, "", ""))
+            continue
+        instances = template.instances
+        if template.error:
+            logger.warning(
+                "Skipping broken template %r: %s", template.id, template.error
+            )
+            continue
+        jobs.extend((template.id, i["uuid"], i["name"]) for i in instances)
+
+    _copy_static_files(output_dir)
+    _write_index_pages(output_dir)
+
+    progress = _Progress(total=len(jobs))
+    logger.info(
+        "Exporting %d reports to %s with %d processes",
+        len(jobs),
+        output_dir,
+        processes,
+    )
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context("fork")
+    ) as pool:
+        pending: dict[concurrent.futures.Future, tuple[str, t.Any]] = {}
+        for template_id, uuid, name in jobs:
+            path = reports.static_report_path(template_id, uuid)
+            future = pool.submit(
+                _export_report,
+                output_dir,
+                template_id,
+                uuid,
+                name,
+                old_manifest["reports"].get(path),
+            )
+            pending[future] = ("report", path)
+
+        seen_diagrams: set[str] = set()
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending,
+                timeout=PROGRESS_INTERVAL,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                kind, path = pending.pop(future)
+                try:
+                    status, entry = future.result()
+                except Exception:
+                    logger.exception("Cannot export %s %s", kind, path)
+                    if kind == "report":
+                        progress.reports_failed += 1
+                    else:
+                        progress.diagrams_failed += 1
+                    continue
+
+                manifest[f"{kind}s"][path] = entry
+                if kind == "diagram":
+                    progress.diagrams_done += 1
+                    progress.diagrams_skipped += status == "skipped"
+                    continue
+
+                progress.reports_done += 1
+                progress.reports_skipped += status == "skipped"
+                for parent, attr, params in entry["diagrams"]:
+                    diagram_path = reports.static_diagram_path(
+                        parent, attr, params
+                    )
+                    if diagram_path in seen_diagrams:
+                        continue
+                    seen_diagrams.add(diagram_path)
+                    diagram_future = pool.submit(
+                        _export_diagram,
+                        output_dir,
+                        parent,
+                        attr,
+                        params,
+                        old_manifest["diagrams"].get(diagram_path),
+                    )
+                    pending[diagram_future] = ("diagram", diagram_path)
+                    progress.diagrams_queued += 1
+            progress.report()
+
+    manifest_path.write_text(json.dumps(manifest), encoding="utf8")
+    progress.report(force=True)
+    logger.info(
+        "Export finished after %s",
+        _format_duration(time.perf_counter() - progress.started),
+    )
+
+
+def _read_manifest(path: pathlib.Path) -> dict[str, dict[str, t.Any]]:
+    if not state.model_revision:
+        logger.warning(
+            "The model revision is unknown, exporting all reports and"
+            " diagrams again"
+        )
+        return {"reports": {}, "diagrams": {}}
+    try:
+        return json.loads(path.read_text(encoding="utf8"))
+    except FileNotFoundError:
+        return {"reports": {}, "diagrams": {}}
+
+
+def _export_report(
+    output_dir: pathlib.Path,
+    template_id: str,
+    model_element_uuid: str,
+    name: str,
+    previous: dict[str, t.Any] | None,
+) -> tuple[str, dict[str, t.Any]]:
+    template = reports.template_by_id(template_id)
+    assert template is not None
+    key = app.report_cache_key(template, model_element_uuid)
+    path = output_dir / reports.static_report_path(
+        template_id, model_element_uuid
+    )
+    if previous is not None and previous["key"] == key and path.is_file():
+        return "skipped", previous
+
+    cancellation = executors.RenderCancellation(template.render_timeout)
+    rendered, diagrams = app._render_report(
+        template_id, model_element_uuid, cancellation
+    )
+    title = f"{template.name}: {name}" if name else template.name
+    status = _write_if_changed(path, _page(title, fh.NotStr(rendered)))
+    return status, {"key": key, "diagrams": diagrams}
+
+
+def _export_diagram(
+    output_dir: pathlib.Path,
+    parent: str,
+    attr: str,
+    params: str,
+    previous: dict[str, t.Any] | None,
+) -> tuple[str, dict[str, t.Any]]:
+    key = app.diagram_cache_key(parent, attr, params)
+    path = output_dir / reports.static_diagram_path(parent, attr, params)
+    if previous is not None and previous["key"] == key and path.is_file():
+        return "skipped", previous
+
+    svg = state.diagram_cache.get(key)
+    if svg is None:
+        svg = app._render_diagram(parent, attr, params)
+        state.diagram_cache.put(key, svg)
+    return _write_if_changed(path, svg), {"key": key}
+
+
+def _write_if_changed(path: pathlib.Path, content: str) -> str:
+    data = content.encode("utf-8")
+    try:
+        if path.read_bytes() == data:
+            return "unchanged"
+    except FileNotFoundError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    return "written"
+
+
+def _page(title: str, content: t.Any, *, root: str = "../") -> str:
+    return fh.to_xml(
+        ft.Html(
+            ft.Head(
+                ft.Meta(charset="utf-8"),
+                ft.Title(title),
+                ft.Link(
+                    rel="stylesheet",
+                    href=f"{root}{c.css_bundle_path}",
+                    type="text/css",
+                ),
+                ft.Link(
+                    rel="icon",
+                    href=f"{root}{c.favicon_path}",
+                    type="image/x-icon",
+                ),
+                ft.Script(charset="utf-8", src=f"{root}{c.js_bundle_path}"),
+                ft.Style(
+                    f":root {{ --primary-color-hue: {c.PRIMARY_COLOR_HUE}; }}"
+                ),
+            ),
+            ft.Body(
+                ft.Main(
+                    ft.H1(title),
+                    content,
+                    cls="prose svg-display dark:prose-invert mx-auto p-8",
+                ),
+                cls="bg-neutral-100 dark:bg-neutral-900",
+            ),
+        )
+    )
+
+
+def _copy_static_files(output_dir: pathlib.Path) -> None:
+    static_dir = pathlib.Path("static")
+    if not (static_dir / "bundle").is_dir():
+        logger.warning(
+            "Static bundle not found in %s, run 'cme build' first",
+            static_dir.resolve(),
+        )
+    shutil.copytree(static_dir, output_dir / "static", dirs_exist_ok=True)
+
+
+def _write_index_pages(output_dir: pathlib.Path) -> None:
+    categories: dict[str, list[reports.Template]] = {}
+    for template in state.templates:
+        if not template.error:
+            categories.setdefault(template.category, []).append(template)
+
+    sections: list[t.Any] = []
+    for category, templates in categories.items():
+        links = [
+            ft.Li(ft.A(i.name, href=_template_index_path(i)))
+            for i in templates
+        ]
+        sections.extend((ft.H2(category), ft.Ul(*links)))
+    _write_if_changed(
+        output_dir / "index.html",
+        _page(_model_name(), ft.Div(*sections), root=""),
+    )
+
+    for template in state.templates:
+        if template.single or template.error:
+            continue
+        links = [
+            ft.Li(ft.A(i["name"], href=f"{i['uuid']}.html"))
+            for i in template.instances
+        ]
+        _write_if_changed(
+            output_dir / template.id / "index.html",
+            _page(template.name, ft.Ul(*links)),
+        )
+
+
+def _template_index_path(template: reports.Template) -> str:
+    return f"{template.id}/index.html"
+
+
+def _model_name() -> str:
+    name = state.model.name
+    if isinstance(name, str) and name:
+        return name
+    return "Model"
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
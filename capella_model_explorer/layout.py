@@ -0,0 +1,62 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Cache for the ELK layouts of context diagrams.
+
+Rendering a context diagram collects the diagram contents into an ELK
+graph, lets elk.js lay it out, and then serializes the result to SVG.
+The layout is by far the slowest of these steps. Many variants of the
+same diagram only differ in parameters that are applied after layout,
+so they send the exact same graph to elk.js.
+
+This module replaces the elk.js manager of
+:mod:`capellambse_context_diagrams` with one that keeps the layout of
+each graph, keyed by a hash of the graph's JSON representation. Only the
+collection and serialization steps are then repeated for such variants.
+"""
+
+from __future__ import annotations
+
+__all__ = ["CachingELKManager", "install"]
+
+import atexit
+import hashlib
+
+import capellambse_context_diagrams
+from capellambse_context_diagrams import _elkjs
+
+from capella_model_explorer import state
+
+
+class CachingELKManager(_elkjs.ELKManager):
+    """An elk.js manager that reuses layouts from the layout cache."""
+
+    def call_elkjs(
+        self, elk_model: _elkjs.ELKInputData
+    ) -> _elkjs.ELKOutputData:
+        request = elk_model.model_dump_json(exclude_defaults=True)
+        key = hashlib.blake2b(
+            f"{capellambse_context_diagrams.__version__}\0{request}".encode(),
+            digest_size=20,
+            usedforsecurity=False,
+        ).hexdigest()
+        if (cached := state.layout_cache.get(key)) is not None:
+            return _elkjs.ELKOutputData.model_validate_json(
+                cached, strict=True
+            )
+
+        layout = super().call_elkjs(elk_model)
+        state.layout_cache.put(key, layout.model_dump_json())
+        return layout
+
+
+def install() -> None:
+    """Use the layout cache for all context diagrams.
+
+    This has to happen before render processes are forked, so that they
+    use the cache as well.
+    """
+    if isinstance(_elkjs.elk_manager, CachingELKManager):
+        return
+    _elkjs.elk_manager.terminate_process()
+    _elkjs.elk_manager = CachingELKManager()
+    atexit.register(_elkjs.elk_manager.terminate_process)
@@ -0,0 +1,135 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Serve the application from multiple pre-forked worker processes.
+
+The model and templates are loaded once in the supervising process,
+which then forks the requested number of uvicorn workers. All workers
+accept connections on the same listening socket and share the loaded
+model through copy-on-write memory, so that adding workers neither
+multiplies the model loading time nor the memory used by the model.
+Each worker forks its render processes (see
+:class:`~capella_model_explorer.executors.RenderFarm`) before it starts
+any threads.
+
+Prometheus metrics are written to the directory named by the
+``PROMETHEUS_MULTIPROC_DIR`` environment variable, which must be set
+before :mod:`prometheus_client` is first imported.
+"""
+
+from __future__ import annotations
+
+__all__ = ["serve"]
+
+import contextlib
+import gc
+import logging
+import logging.config
+import os
+import signal
+import socket
+import typing as t
+
+import prometheus_client.multiprocess
+import uvicorn
+
+import capella_model_explorer.constants as c
+from capella_model_explorer import app, state
+
+logger = logging.getLogger(__name__)
+
+
+def serve(*, workers: int, log_config: dict[str, t.Any]) -> None:
+    """Load the model, then serve it from ``workers`` forked processes.
+
+    Workers that exit unexpectedly are replaced, until the supervising
+    process receives SIGINT or SIGTERM.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        raise RuntimeError("PROMETHEUS_MULTIPROC_DIR is not set")
+
+    logging.config.dictConfig(log_config)
+    app.log_configuration()
+    app.load()
+    if not state.ready.is_set():
+        raise SystemExit("Cannot load the model, exiting")
+
+    sock = socket.create_server((c.HOST, c.PORT), backlog=2048)
+    logger.info("Listening on http://%s:%d", c.HOST, c.PORT)
+    # Move everything loaded so far out of the garbage collector's reach,
+    # so that collections in the workers don't touch (and thereby copy)
+    # the pages holding the shared model.
+    gc.freeze()
+
+    stopping = False
+    children: dict[int, int] = {}
+
+    def stop(signum: int, _: t.Any) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signum)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for index in range(workers):
+        children[_spawn_worker(sock, log_config, index)] = index
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        if pid not in children:
+            continue
+        index = children.pop(pid)
+        prometheus_client.multiprocess.mark_process_dead(pid)
+        if stopping:
+            continue
+        logger.warning(
+            "Worker %d exited with status %d, restarting",
+            pid,
+            os.waitstatus_to_exitcode(status),
+        )
+        children[_spawn_worker(sock, log_config, index)] = index
+
+    sock.close()
+    logger.info("All workers stopped")
+
+
+def _spawn_worker(
+    sock: socket.socket, log_config: dict[str, t.Any], index: int
+) -> int:
+    pid = os.fork()
+    if pid:
+        logger.info("Started worker %d with pid %d", index, pid)
+        return pid
+
+    status = 1
+    state.worker_index = index
+    try:
+        # Signals are forwarded by the supervisor. Leaving its process
+        # group prevents workers from receiving a terminal's Ctrl+C twice.
+        os.setpgid(0, 0)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        # Fork the render processes while this is still the only thread
+        app.render_farm.start()
+        config = uvicorn.Config(
+            app.app,
+            host=c.HOST,
+            port=c.PORT,
+            log_config=log_config,
+            lifespan="on",
+        )
+        uvicorn.Server(config).run(sockets=[sock])
+        status = 0
+    except Exception:
+        logger.exception("Worker %d crashed", os.getpid())
+    finally:
+        app.render_farm.shutdown()
+        logging.shutdown()
+        os._exit(status)
@@ -4,11 +4,20 @@
 from __future__ import annotations
 
 import base64
+import collections.abc as cabc
+import concurrent.futures
+import contextvars
+import functools
+import hashlib
 import json
 import logging
+import multiprocessing
 import operator
+import os
 import pathlib
 import re
+import threading
+import time
 import traceback
 import typing as t
 
@@ -16,18 +25,20 @@ import capellambse
 import capellambse.model as m
 import capellambse_context_diagrams
 import jinja2
+import jinja2.meta
 import markupsafe
 import pydantic as p
 import yaml
 
 import capella_model_explorer
 import capella_model_explorer.constants as c
-from capella_model_explorer import app, core, state
+from capella_model_explorer import app, core, executors, snapshot, state
 
 SVG_PLACEHOLDER_MARKUP = markupsafe.Markup(
     '<div class="svg-container relative inline-block cursor-wait px-6 py-4 animate-pulse'
     ' rounded-full bg-primary-500 text-neutral-300 dark:bg-primary-700 dark:text-neutral-400"'
-    ' hx-trigger="load" hx-get="{url}" hx-swap="outerHTML" hx-headers="{headers}">'
+    ' data-diagram-id="{diagram_id}" hx-trigger="diagram-fallback"'
+    ' hx-get="{url}" hx-swap="outerHTML" hx-headers="{headers}">'
     "Loading diagram..."
     "</div>"
 )
@@ -54,6 +65,18 @@ SVG_WRAP_MARKUP = markupsafe.Markup(
 
 logger = logging.getLogger(__name__)
 
+_parse_env = jinja2.Environment()
+"""Environment used to find references between templates."""
+
+collected_diagrams: contextvars.ContextVar[list[tuple[str, str, str]]] = (
+    contextvars.ContextVar("collected_diagrams")
+)
+"""Collects the ``(parent, attr, params)`` of each diagram placeholder.
+
+Only set while rendering a report, so that diagrams can be rendered
+ahead of time during the cache warm-up and static exports.
+"""
+
 
 class Template(p.BaseModel):
     id: str = p.Field(title="Template identifier")
@@ -69,33 +92,111 @@ class Template(p.BaseModel):
         None, title="Experimental template flag"
     )
     path: pathlib.Path = p.Field(title="Absolute file path to template")
+    timeout: float | None = p.Field(
+        None, title="Render timeout in seconds, overriding the default"
+    )
     error: str | None = p.Field(None, title="Broken template flag")
     traceback: str | None = p.Field(None, title="Template error traceback")
-    instance_count: int = p.Field(0, title="Number of instances")
-    instances: list[dict] = p.Field([], title="List of instances")
 
-    def model_post_init(self, _):
-        self._compute_instances()
+    _instances: list[dict] | None = p.PrivateAttr(None)
+    _instances_lock: threading.Lock = p.PrivateAttr(
+        default_factory=threading.Lock
+    )
+    _jinja_template: jinja2.Template | None = p.PrivateAttr(None)
+
+    @property
+    def instances(self) -> list[dict]:
+        """The model elements this template can be rendered for.
+
+        The list is computed on first access if it is not yet known.
+        """
+        return self.compute_instances()
+
+    @property
+    def instance_count(self) -> int:
+        if self.single:
+            return 1
+        return len(self.instances)
+
+    @property
+    def render_timeout(self) -> float | None:
+        """Time in seconds after which rendering is aborted, if any."""
+        timeout = (
+            self.timeout if self.timeout is not None else c.RENDER_TIMEOUT
+        )
+        return timeout or None
 
-    def _compute_instances(self) -> None:
+    @property
+    def known_instance_count(self) -> int | None:
+        """The number of instances, or None if not computed yet."""
         if self.single:
-            self.instance_count = 1
-            return
+            return 1
+        if self._instances is None:
+            return None
+        return len(self._instances)
+
+    def compute_instances(self) -> list[dict]:
+        """Compute and memoize the list of instances.
+
+        Concurrent callers wait for and share the same computation.
+        """
+        instances = self._instances
+        if instances is None:
+            with self._instances_lock:
+                if self._instances is None:
+                    self._instances = self._compute_instances()
+                instances = self._instances
+        return instances
+
+    def load_jinja_template(self) -> jinja2.Template:
+        """Get the compiled template from the Jinja environment.
+
+        The environment caches compiled templates, including imported
+        macro libraries, and recompiles them when the files change.
+        """
+        path = pathlib.Path(os.path.normpath(self.path))
+        try:
+            name = path.relative_to(c.TEMPLATES_DIR).as_posix()
+        except ValueError:
+            state.template_cache_misses.inc()
+            return state.jinja_env.from_string(path.read_text(encoding="utf8"))
+
+        jinja_template = state.jinja_env.get_template(name)
+        if jinja_template is self._jinja_template:
+            state.template_cache_hits.inc()
+        else:
+            state.template_cache_misses.inc()
+            self._jinja_template = jinja_template
+        return jinja_template
+
+    def _set_instances(
+        self,
+        instances: list[dict],
+        error: str | None,
+        traceback: str | None,
+    ) -> None:
+        with self._instances_lock:
+            self._instances = instances
+            self.error = error
+            self.traceback = traceback
+
+    def _compute_instances(self) -> list[dict]:
+        if self.single or self.scope is None:
+            return []
         try:
-            if self.scope is not None:
-                self.instances = [
-                    self._simple_object(obj)
-                    for obj in self._find_objects(
-                        obj_type=self.scope.type,
-                        below=self.scope.below,
-                        attr=None,
-                        filters=self.scope.filters,
-                    )
-                ]
-            self.instance_count = len(self.instances)
+            return [
+                self._simple_object(obj)
+                for obj in self._find_objects(
+                    obj_type=self.scope.type,
+                    below=self.scope.below,
+                    attr=None,
+                    filters=self.scope.filters,
+                )
+            ]
         except Exception as e:
             self.error = f"Template scope error: {e}"
             self.traceback = traceback.format_exc()
+            return []
 
     def _find_objects(
         self, obj_type=None, below=None, attr=None, filters=None
@@ -110,11 +211,8 @@ class Template(p.BaseModel):
                     f"Expected a list of model objects or a single model object"
                     f" for {attr!r} of the model, got {objects!r}"
                 )
-        elif below and obj_type:
-            getter = operator.attrgetter(below)
-            objects = state.model.search(obj_type, below=getter(state.model))
         elif obj_type:
-            objects = state.model.search(obj_type)
+            objects = state.type_index.search(obj_type, below=below)
         else:
             raise ValueError("No search criteria provided")
 
@@ -142,6 +240,76 @@ class Template(p.BaseModel):
         return {"uuid": obj.uuid, "name": str(name)}
 
 
+render_cancellation: contextvars.ContextVar[executors.RenderCancellation] = (
+    contextvars.ContextVar("render_cancellation")
+)
+
+
+class RenderMemo:
+    """Remembers model lookups made while rendering a single report.
+
+    Templates tend to look up the same elements and follow the same
+    relations many times. The model does not change during a render, so
+    the results can be reused until the render is done.
+    """
+
+    def __init__(self) -> None:
+        self.elements: dict[str, t.Any] = {}
+        self.attributes: dict[tuple[str, str], t.Any] = {}
+
+
+render_memo: contextvars.ContextVar[RenderMemo] = contextvars.ContextVar(
+    "render_memo"
+)
+
+
+def lookup_element(uuid: str, /) -> t.Any:
+    """Look up a model element, reusing the result within a render."""
+    memo = render_memo.get(None)
+    if memo is None:
+        return state.model.by_uuid(uuid)
+
+    elem = memo.elements.get(uuid)
+    if elem is None:
+        elem = memo.elements[uuid] = state.model.by_uuid(uuid)
+    else:
+        state.render_lookups_saved.labels("element").inc()
+    return elem
+
+
+class RenderEnvironment(jinja2.Environment):
+    """A Jinja environment that memoizes lookups in the model.
+
+    While a :class:`RenderMemo` is active, attributes of model elements
+    are only computed once per render, and ``model.by_uuid`` uses
+    :func:`lookup_element`.
+    """
+
+    def getattr(self, obj: t.Any, attribute: str) -> t.Any:
+        memo = render_memo.get(None)
+        if memo is None:
+            return super().getattr(obj, attribute)
+        if isinstance(obj, capellambse.MelodyModel) and attribute == "by_uuid":
+            return lookup_element
+        if not isinstance(obj, m.ModelElement):
+            return super().getattr(obj, attribute)
+
+        key = (obj.uuid, attribute)
+        try:
+            value = memo.attributes[key]
+        except KeyError:
+            pass
+        else:
+            state.render_lookups_saved.labels("attribute").inc()
+            return value
+
+        value = super().getattr(obj, attribute)
+        # Iterators can only be consumed once
+        if not isinstance(value, cabc.Iterator | jinja2.Undefined):
+            memo.attributes[key] = value
+        return value
+
+
 class TemplateScope(p.BaseModel):
     type: str | None = p.Field(None, title="Model Element Type")
     below: t.Literal["oa", "sa", "la", "pa"] | None = p.Field(
@@ -175,6 +343,136 @@ class TemplateScope(p.BaseModel):
         return True
 
 
+class TypeIndex:
+    """Index of all semantic model elements by class and layer.
+
+    The index is built with a single traversal of the model, and allows
+    resolving template scopes without searching the whole model once for
+    every template. Search results are in the same order as those of
+    :meth:`capellambse.MelodyModel.search`.
+
+    Like ``search()``, the index is built from the per-fragment type
+    caches of the model's loader, which are not part of the public API
+    of capellambse.
+    """
+
+    LAYERS: t.Final = ("oa", "sa", "la", "pa")
+
+    def __init__(self, model: capellambse.MelodyModel, /) -> None:
+        self.model = model
+
+        layer_of: dict[int, str] = {}
+        for layer in self.LAYERS:
+            root = getattr(model, layer)._element
+            for elem in model._loader.iterdescendants(root):
+                layer_of[id(elem)] = layer
+
+        # One group per fragment and type, in the order search() visits
+        # them, with the group's elements split up by layer as well
+        semantic = capellambse.loader.FragmentType.SEMANTIC
+        self._groups: list[
+            tuple[type, list[t.Any], dict[str | None, list[t.Any]]]
+        ] = []
+        for tree in model._loader.trees.values():
+            if tree.fragment_type is not semantic:
+                continue
+            for qtype in tree.iter_qtypes():
+                try:
+                    cls = model.resolve_class(qtype)
+                except KeyError:
+                    continue
+                elements = list(tree.iter_qtype(qtype))
+                by_layer: dict[str | None, list[t.Any]] = {}
+                for elem in elements:
+                    elem_layer = layer_of.get(id(elem))
+                    by_layer.setdefault(elem_layer, []).append(elem)
+                self._groups.append((cls, elements, by_layer))
+
+    def search(
+        self,
+        clsname: str,
+        /,
+        *,
+        below: t.Literal["oa", "sa", "la", "pa"] | None = None,
+    ) -> m.ElementList:
+        """Find all elements of a class, optionally below a layer.
+
+        Like :meth:`capellambse.MelodyModel.search`, this includes
+        instances of subclasses of the requested class.
+        """
+        cls = self.model.resolve_class(clsname)
+        if cls is m.ModelElement or issubclass(
+            cls, m.DRepresentationDescriptor
+        ):
+            below_obj = getattr(self.model, below) if below else None
+            return self.model.search(clsname, below=below_obj)
+
+        elements: list[t.Any] = []
+        for candidate, group, by_layer in self._groups:
+            if not issubclass(candidate, cls):
+                continue
+            if below is None:
+                elements.extend(group)
+            else:
+                elements.extend(by_layer.get(below, ()))
+        return m.ElementList(self.model, elements, m.ModelElement)
+
+
+class LinkIndex:
+    """Index of the templates that links to model elements point to.
+
+    A link points to the first template whose scope applies to the
+    element, or to the generic template if there is none. The index
+    groups the candidate templates by element type, so that only the
+    scopes for the element's own type need to be checked, and remembers
+    the resulting link for each element.
+    """
+
+    def __init__(self, templates: t.Iterable[Template], /) -> None:
+        self.generic: Template | None = None
+        self._unscoped: list[Template] = []
+        self._by_type: dict[str, list[Template]] = {}
+        self._hrefs: dict[tuple[str, bool], str | None] = {}
+
+        for template in templates:
+            if template.path.name.startswith("__generic__"):
+                self.generic = template
+            elif template.single:
+                continue
+            elif template.scope is None:
+                # Applies to all elements, including those of types that
+                # no other template is scoped to
+                self._unscoped.append(template)
+                for candidates in self._by_type.values():
+                    candidates.append(template)
+            elif template.scope.type:
+                self._by_type.setdefault(
+                    template.scope.type, list(self._unscoped)
+                ).append(template)
+
+    def href(self, obj: m.ModelElement | m.AbstractDiagram, /) -> str | None:
+        """Get the link to the report page for a model element."""
+        key = (obj.uuid, state.static_export)
+        try:
+            return self._hrefs[key]
+        except KeyError:
+            pass
+
+        xtype = (obj.xtype or "").rsplit(":", 1)[-1]
+        candidates = self._by_type.get(xtype, self._unscoped)
+        for template in candidates:
+            if template.scope is None or template.scope.applies_to(obj):
+                href: str | None = report_href(template.id, obj.uuid)
+                break
+        else:
+            if self.generic is None:
+                href = None
+            else:
+                href = report_href(self.generic.id, obj.uuid)
+        self._hrefs[key] = href
+        return href
+
+
 class TemplateCategory(p.BaseModel):
     idx: str = p.Field(title="Category Identifier")
     templates: list[Template] = p.Field(
@@ -201,34 +499,43 @@ def _register_template_category(category: str) -> None:
 def _make_href(
     obj: m.ModelElement | m.AbstractDiagram,
 ) -> str | None:
-    generic_template: Template | None = None
-    for template in state.templates:
-        if template.path.name.startswith("__generic__"):
-            generic_template = template
-            continue
-
-        if template.single:
-            continue
+    return state.link_index.href(obj)
 
-        if template.scope and not template.scope.applies_to(obj):
-            continue
 
-        return app.app.url_path_for(
-            "template_page",
-            template_id=template.id,
-            model_element_uuid=obj.uuid,
-        )
+def report_href(template_id: str, model_element_uuid: str) -> str:
+    """Build the link to a report page.
 
-    if generic_template is None:
-        return None
+    During a static export, this is a path relative to another report.
+    """
+    if state.static_export:
+        return f"../{static_report_path(template_id, model_element_uuid)}"
     return app.app.url_path_for(
         "template_page",
-        template_id=generic_template.id,
-        model_element_uuid=obj.uuid,
+        template_id=template_id,
+        model_element_uuid=model_element_uuid,
     )
 
 
+def static_report_path(template_id: str, model_element_uuid: str) -> str:
+    """Get the path of a report page within a static export."""
+    return f"{template_id}/{model_element_uuid or 'index'}.html"
+
+
+def static_diagram_path(parent: str, attr: str, params: str) -> str:
+    """Get the path of a diagram within a static export."""
+    name = f"{parent}-{attr}"
+    if params:
+        digest = hashlib.blake2b(
+            params.encode("utf-8"), digest_size=6, usedforsecurity=False
+        ).hexdigest()
+        name = f"{name}-{digest}"
+    return f"diagrams/{name}.svg"
+
+
 def finalize(markup: t.Any) -> object:
+    if (cancellation := render_cancellation.get(None)) is not None:
+        cancellation.check()
+
     if markup is None:
         return ""
 
@@ -270,7 +577,7 @@ def make_href_filter(obj: object) -> str | None:
     if not isinstance(obj, m.ModelElement | m.AbstractDiagram):
         raise TypeError(f"Expected a model object, got {obj!r}")
     try:
-        state.model.by_uuid(obj.uuid)
+        lookup_element(obj.uuid)
     except KeyError:
         return "#"
     return _make_href(obj)
@@ -290,7 +597,7 @@ def diagram_placeholder(
     if not isinstance(attr, str) or not attr.isidentifier():
         raise TypeError("Attribute must be a Python identifier string")
     try:
-        can_find = state.model.by_uuid(parent.uuid) == parent
+        can_find = lookup_element(parent.uuid) == parent
     except KeyError:
         can_find = False
     if not can_find:
@@ -318,11 +625,38 @@ def diagram_placeholder(
                 f"Render parameters must be JSON serializable: {kw!r}"
             ) from None
         url = f"{url}?params={params}"
+    else:
+        params = ""
+    if (collected := collected_diagrams.get(None)) is not None:
+        collected.append((parent.uuid, attr, params))
+    if state.static_export:
+        return SVG_WRAP_MARKUP.format(
+            svg_data=f"../{static_diagram_path(parent.uuid, attr, params)}",
+            title=diag.name,
+        )
 
     render_environment = compute_cache_key(None)
     headers = json.dumps({"Render-Environment": render_environment})
 
-    return SVG_PLACEHOLDER_MARKUP.format(url=url, headers=headers)
+    return SVG_PLACEHOLDER_MARKUP.format(
+        diagram_id=diagram_element_id(parent.uuid, attr, params),
+        url=url,
+        headers=headers,
+    )
+
+
+def diagram_element_id(parent: str, attr: str, params: str) -> str:
+    """Get the ID identifying a diagram's placeholders in a report.
+
+    Placeholders are filled with the diagram either from the report's
+    diagram stream, or by requesting the diagram individually, if it is
+    not part of the stream.
+    """
+    return hashlib.blake2b(
+        f"{parent}\0{attr}\0{params}".encode(),
+        digest_size=6,
+        usedforsecurity=False,
+    ).hexdigest()
 
 
 def render_diagram(svg: str, title: str, /) -> markupsafe.Markup:
@@ -334,6 +668,34 @@ def render_diagram(svg: str, title: str, /) -> markupsafe.Markup:
 
 
 def load_templates() -> None:
+    start = time.perf_counter()
+    state.type_index = TypeIndex(state.model)
+    index_time = time.perf_counter() - start
+    _read_templates()
+
+    scoped = sum(1 for i in state.templates if i.scope and i.scope.type)
+    if c.LAZY_INSTANCES:
+        logger.info(
+            "Built type index in %.2fs, %d template scopes will be"
+            " resolved on first use",
+            index_time,
+            scoped,
+        )
+        return
+
+    start = time.perf_counter()
+    _compute_all_instances()
+    logger.info(
+        "Built type index in %.2fs and resolved %d template scopes in %.2fs",
+        index_time,
+        scoped,
+        time.perf_counter() - start,
+    )
+
+
+def _read_templates() -> None:
+    state.templates.clear()
+    state.template_categories.clear()
     for idx_path in sorted(c.TEMPLATES_DIR.glob("**/*.yaml")):
         category = re.sub(r"^[A-Za-z0-9]{2}-", "", idx_path.parent.name)
         template_defs = yaml.safe_load(idx_path.read_text(encoding="utf8"))
@@ -345,18 +707,177 @@ def load_templates() -> None:
             template = Template(**template_def)
             state.templates.append(template)
         _register_template_category(category)
+    state.link_index = LinkIndex(state.templates)
+
+
+def _compute_all_instances() -> None:
+    """Resolve the scopes of all templates, using a worker pool if possible.
+
+    If forking is not available or the worker pool breaks down, the
+    remaining scopes are resolved in this process.
+    """
+    pending = [i for i in state.templates if i.scope and not i.single]
+    workers = min(c.TEMPLATE_WORKERS or os.cpu_count() or 1, len(pending))
+    pool = _make_template_worker_pool(workers) if workers > 1 else None
+    if pool is not None:
+        try:
+            with pool:
+                results = pool.map(
+                    _compute_template_instances, [i.id for i in pending]
+                )
+                for template, result in zip(pending, results, strict=True):
+                    template._set_instances(*result)
+        except concurrent.futures.process.BrokenProcessPool:
+            logger.exception(
+                "Template worker pool broke down, resolving serially"
+            )
+
+    for template in state.templates:
+        template.compute_instances()
+
+
+def _make_template_worker_pool(
+    workers: int,
+) -> concurrent.futures.ProcessPoolExecutor | None:
+    """Create the worker pool for resolving template scopes.
+
+    While this is the only thread, i.e. when loading before the server
+    starts, the workers are forked from the current process, so that
+    they share the already loaded model and type index. Forking a
+    process with more than one thread can leave locks held by the other
+    threads locked forever in the children. In that case the workers are
+    started from a fresh interpreter instead, and load the model from
+    the snapshot that was just written. Without a snapshot that would
+    take as long as resolving the scopes here, so no pool is used.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if threading.active_count() == 1 and "fork" in methods:
+        logger.debug("Resolving template scopes with %d workers", workers)
+        return concurrent.futures.ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("fork")
+        )
+    if c.MODEL_SNAPSHOT and state.model_revision:
+        method = "forkserver" if "forkserver" in methods else "spawn"
+        logger.debug(
+            "Resolving template scopes with %d workers started with %r",
+            workers,
+            method,
+        )
+        return concurrent.futures.ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context(method),
+            initializer=_init_template_worker,
+        )
+    logger.debug(
+        "Other threads are running and there is no model snapshot,"
+        " resolving template scopes serially"
+    )
+    return None
+
+
+def _init_template_worker() -> None:
+    model_spec = capellambse.loadinfo(c.MODEL)
+    state.model, state.model_revision = snapshot.load_model(model_spec)
+    state.type_index = TypeIndex(state.model)
+    _read_templates()
+
+
+def _compute_template_instances(
+    template_id: str,
+) -> tuple[list[dict], str | None, str | None]:
+    template = template_by_id(template_id)
+    assert template is not None
+    instances = template.compute_instances()
+    return instances, template.error, template.traceback
 
 
 def compute_cache_key(template: Template | None, /) -> str:
+    if template is None:
+        template_hash = None
+    else:
+        template_hash = compute_template_hash(template.path)
+    return _compute_cache_key(
+        template_hash, state.model_revision or None, c.LAUNCH_ID
+    )
+
+
+def compute_template_hash(path: str | os.PathLike[str], /) -> str:
+    """Compute a hash of a template and all templates it references.
+
+    References are found by parsing the templates, and include imported
+    and included templates as well as the templates that are extended.
+    If a template references another one by a name that is only known
+    while rendering, the hash covers all templates in the templates
+    directory instead.
+    """
+    path = pathlib.Path(os.path.normpath(path))
+    try:
+        name = path.relative_to(c.TEMPLATES_DIR).as_posix()
+    except ValueError:
+        return core.compute_file_hash(str(path))
+
+    hashes: dict[str, str] = {}
+    pending = [name]
+    while pending:
+        name = pending.pop()
+        if name in hashes:
+            continue
+        file_path = str(c.TEMPLATES_DIR / name)
+        hashes[name] = core.compute_file_hash(file_path)
+        references = _find_referenced_templates(file_path, hashes[name])
+        if references is None:
+            hashes = {
+                i.relative_to(c.TEMPLATES_DIR).as_posix(): (
+                    core.compute_file_hash(str(i))
+                )
+                for i in c.TEMPLATES_DIR.rglob("*.j2")
+            }
+            break
+        pending.extend(references)
+
+    hasher = hashlib.blake2b(digest_size=9, usedforsecurity=False)
+    for name, file_hash in sorted(hashes.items()):
+        hasher.update(f"{name}\0{file_hash}\0".encode())
+    return base64.urlsafe_b64encode(hasher.digest()).decode("utf-8")
+
+
+@functools.lru_cache(maxsize=1024)
+def _find_referenced_templates(
+    file_path: str, file_hash: str
+) -> tuple[str, ...] | None:
+    """Find the names of the templates referenced by a template file.
+
+    Returns None if a name is only known while rendering, or if the
+    template cannot be parsed. The file hash is only used to invalidate
+    the cache when the file changes.
+    """
+    del file_hash
+    try:
+        source = pathlib.Path(file_path).read_text(encoding="utf8")
+        ast = _parse_env.parse(source)
+    except FileNotFoundError:
+        return ()
+    except (OSError, jinja2.TemplateSyntaxError):
+        return None
+    references = tuple(jinja2.meta.find_referenced_templates(ast))
+    if None in references:
+        return None
+    return t.cast(tuple[str, ...], references)
+
+
+@functools.lru_cache(maxsize=1024)
+def _compute_cache_key(
+    template_hash: str | None, model_revision: str | None, launch_id: str
+) -> str:
     data = {
         "model-explorer-version": capella_model_explorer.__version__,
         "capellambse-version": capellambse.__version__,
         "ctx-diags-version": capellambse_context_diagrams.__version__,
     }
-    if template is not None:
-        data["template-hash"] = core.compute_file_hash(str(template.path))
-    if model_revision := state.model.info.resources["\x00"].rev_hash:
+    if template_hash is not None:
+        data["template-hash"] = template_hash
+    if model_revision:
         data["model-revision"] = model_revision
     else:
-        data["launch-id"] = c.LAUNCH_ID
+        data["launch-id"] = launch_id
     return json.dumps(data)
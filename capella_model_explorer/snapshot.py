@@ -0,0 +1,387 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""On-disk snapshots of loaded models.
+
+Most of the time spent loading a model goes into indexing the elements
+of every fragment by ID and type, which capellambse does in Python for
+each element. Git-backed models additionally require a full clone of the
+repository whenever the local capellambse cache is not available, which
+is the case after every container restart.
+
+Snapshots are kept in the cache directory and contain the element index
+of every fragment, as positions in document order. Loading a model with
+a snapshot only parses the XML, which lxml does in C, and then restores
+the index from the snapshot. Snapshots of Git-backed models also contain
+a plain copy of the model files, so that the clone can be skipped.
+
+Snapshots are keyed by a revision of the model: For Git-backed models it
+is the commit hash, which is determined with a cheap ``git ls-remote``
+call before loading. For models in local directories it is a hash of the
+contents of all model files, which is also used as model revision for
+cache keys, so that rendered reports and diagrams survive restarts.
+Only the :data:`KEEP_SNAPSHOTS` most recently used snapshots are kept.
+"""
+
+from __future__ import annotations
+
+__all__ = ["KEEP_SNAPSHOTS", "load_model"]
+
+import collections
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import typing as t
+
+import capellambse
+import capellambse.loader.core
+import prometheus_client
+from lxml import etree
+
+import capella_model_explorer.constants as c
+from capella_model_explorer import state
+
+logger = logging.getLogger(__name__)
+
+GIT_HANDLER_ARGS = frozenset(
+    {
+        "disable_cache",
+        "identity_file",
+        "known_hosts_file",
+        "password",
+        "revision",
+        "subdir",
+        "update_cache",
+        "username",
+    }
+)
+"""Arguments only understood by the Git file handler."""
+INDEX_NAME = "index.json"
+KEEP_SNAPSHOTS = 3
+"""Number of most recently used snapshots kept in the cache directory."""
+SNAPSHOT_FORMAT = 2
+"""Version of the snapshot layout, part of the snapshot key."""
+STALE_TMPDIR_AGE = 24 * 60 * 60
+"""Time in seconds after which unfinished snapshots are deleted."""
+
+_GIT_OBJECT_NAME = re.compile(r"^[0-9a-fA-F]{40}$")
+_CHUNK_SIZE = 1024 * 1024
+
+model_load_source = prometheus_client.Enum(
+    "model_load_source",
+    "Where the currently served model was loaded from",
+    states=["original", "snapshot"],
+)
+state.loaded_state_collectors.append(model_load_source)
+
+
+class _IndexedModelFile(capellambse.loader.core.ModelFile):
+    """A model fragment that restores its element index from a snapshot.
+
+    Fragments that are not part of the snapshot, and all later rebuilds
+    of the index, are handled by capellambse as usual.
+    """
+
+    root_dir: t.ClassVar[pathlib.Path | None] = None
+    pending: t.ClassVar[dict[str, dict[str, t.Any]]] = {}
+
+    def idcache_rebuild(self) -> None:
+        index = None
+        handler_dir = getattr(self.filehandler, "path", None)
+        if (
+            isinstance(handler_dir, pathlib.Path)
+            and self.root_dir is not None
+            and handler_dir.resolve() == self.root_dir
+        ):
+            index = self.pending.pop(str(self.filename), None)
+        if index is None or not self._restore_index(index):
+            super().idcache_rebuild()
+
+    def _restore_index(self, index: dict[str, t.Any]) -> bool:
+        elements = list(self.root.iter())
+        if len(elements) != index["elements"]:
+            logger.warning("Snapshot index of %s is outdated", self.filename)
+            return False
+
+        qtypes: collections.defaultdict[etree.QName, dict[int, t.Any]]
+        qtypes = collections.defaultdict(dict)
+        for qtype, positions in index["qtypes"].items():
+            qtypes[etree.QName(qtype)] = {
+                id(elements[i]): elements[i] for i in positions
+            }
+        xtypes: collections.defaultdict[str, dict[int, t.Any]]
+        xtypes = collections.defaultdict(dict)
+        for xtype, positions in index["xtypes"].items():
+            xtypes[xtype] = {id(elements[i]): elements[i] for i in positions}
+        # The caches are private to ModelFile, see ``idcache_rebuild()``
+        vars(self).update(
+            _ModelFile__qtypecache=qtypes,
+            _ModelFile__xtypecache=xtypes,
+            _ModelFile__idcache={k: elements[i] for k, i in index["ids"]},
+            _ModelFile__hrefsources={
+                k: elements[i] for k, i in index["hrefs"]
+            },
+        )
+        return True
+
+
+def load_model(
+    spec: dict[str, t.Any],
+) -> tuple[capellambse.MelodyModel, str | None]:
+    """Load the model described by ``spec``, using a snapshot if possible.
+
+    Parameters
+    ----------
+    spec
+        The model loading arguments, as returned by
+        :func:`capellambse.loadinfo`.
+
+    Returns
+    -------
+    tuple[capellambse.MelodyModel, str | None]
+        The loaded model and its revision, if known. This is either the
+        revision hash of its primary resource, or a hash of the model
+        files for models in local directories.
+    """
+    revision = None
+    local_dir = _local_model_dir(spec)
+    if local_dir is not None:
+        revision = _hash_model_files(local_dir)
+    elif c.MODEL_SNAPSHOT:
+        revision = _resolve_git_revision(spec)
+
+    key = None
+    if c.MODEL_SNAPSHOT and revision is not None:
+        key = _snapshot_key(spec, revision)
+        snapshot_dir = c.CACHE_DIR / "snapshots" / key
+        if (snapshot_dir / INDEX_NAME).is_file():
+            logger.info("Loading model snapshot from: %s", snapshot_dir)
+            if local_dir is not None:
+                snapshot_spec = spec
+                model_dir = local_dir
+            else:
+                snapshot_spec = {
+                    k: v for k, v in spec.items() if k not in GIT_HANDLER_ARGS
+                }
+                snapshot_spec["path"] = model_dir = snapshot_dir / "model"
+            with contextlib.suppress(OSError):
+                os.utime(snapshot_dir)
+            model = _load_indexed(
+                snapshot_spec, snapshot_dir / INDEX_NAME, model_dir
+            )
+            model_load_source.state("snapshot")
+            state.model_load_source = "snapshot"
+            return model, revision
+
+    model = capellambse.MelodyModel(**spec)
+    model_load_source.state("original")
+    state.model_load_source = "original"
+    if local_dir is None:
+        rev_hash = model.info.resources["\x00"].rev_hash
+        if rev_hash != revision:
+            key = None
+        revision = rev_hash or None
+    if key is not None:
+        try:
+            _write_snapshot(model, key, with_files=local_dir is None)
+        except OSError:
+            logger.exception("Cannot write model snapshot, ignoring")
+        _prune_snapshots()
+    return model, revision
+
+
+def _load_indexed(
+    spec: dict[str, t.Any], index_path: pathlib.Path, model_dir: pathlib.Path
+) -> capellambse.MelodyModel:
+    index = json.loads(index_path.read_text(encoding="utf8"))
+    loader_core = capellambse.loader.core
+    original = loader_core.ModelFile
+    _IndexedModelFile.root_dir = model_dir.resolve()
+    _IndexedModelFile.pending = index["fragments"]
+    loader_core.ModelFile = _IndexedModelFile  # type: ignore[misc]
+    try:
+        return capellambse.MelodyModel(**spec)
+    finally:
+        loader_core.ModelFile = original  # type: ignore[misc]
+        _IndexedModelFile.root_dir = None
+        _IndexedModelFile.pending = {}
+
+
+def _local_model_dir(spec: dict[str, t.Any]) -> pathlib.Path | None:
+    handler_name, path = capellambse.filehandler.split_protocol(spec["path"])
+    if handler_name != "file" or not isinstance(path, pathlib.Path):
+        return None
+    if path.is_file():
+        path = path.parent
+    subdir = str(spec.get("subdir", "/")).strip("/")
+    return (path / subdir).resolve()
+
+
+def _hash_model_files(root: pathlib.Path) -> str | None:
+    hasher = hashlib.blake2b(digest_size=20, usedforsecurity=False)
+    try:
+        files = sorted(
+            i
+            for i in root.rglob("*")
+            if i.suffix in capellambse.loader.core.VALID_EXTS
+            and ".git" not in i.relative_to(root).parts
+        )
+        for file in files:
+            hasher.update(f"{file.relative_to(root).as_posix()}\0".encode())
+            with file.open("rb") as f:
+                while chunk := f.read(_CHUNK_SIZE):
+                    hasher.update(chunk)
+    except OSError as err:
+        logger.warning("Cannot hash model files: %s", err)
+        return None
+    return f"content:{hasher.hexdigest()}"
+
+
+def _resolve_git_revision(spec: dict[str, t.Any]) -> str | None:
+    handler_name, path = capellambse.filehandler.split_protocol(spec["path"])
+    if handler_name != "git" or str(spec.get("subdir", "/")).strip("/"):
+        return None
+
+    revision = spec.get("revision") or "HEAD"
+    if _GIT_OBJECT_NAME.search(revision):
+        return revision.lower()
+
+    git = shutil.which("git")
+    if git is None:
+        return None
+    env = os.environ | {"GIT_TERMINAL_PROMPT": "0"}
+    try:
+        listing = subprocess.run(
+            [git, "ls-remote", str(path), revision],
+            capture_output=True,
+            check=True,
+            env=env,
+            text=True,
+            timeout=60,
+        ).stdout
+    except (OSError, subprocess.SubprocessError) as err:
+        logger.warning("Cannot resolve model revision for snapshot: %s", err)
+        return None
+
+    refs = [line.split("\t") for line in listing.strip().splitlines()]
+    if len(refs) > 1:
+        refs = [
+            i for i in refs if i[1] in {revision, f"refs/heads/{revision}"}
+        ]
+    if len(refs) != 1:
+        logger.warning(
+            "Cannot resolve model revision %r for snapshot, found %d refs",
+            revision,
+            len(refs),
+        )
+        return None
+    return refs[0][0].lower()
+
+
+def _snapshot_key(spec: dict[str, t.Any], revision: str) -> str:
+    data = json.dumps(
+        [
+            SNAPSHOT_FORMAT,
+            capellambse.__version__,
+            str(spec["path"]),
+            str(spec.get("entrypoint", "")),
+            revision,
+        ]
+    )
+    return hashlib.blake2b(
+        data.encode("utf-8"), digest_size=16, usedforsecurity=False
+    ).hexdigest()
+
+
+def _write_snapshot(
+    model: capellambse.MelodyModel, key: str, *, with_files: bool
+) -> None:
+    snapshots_dir = c.CACHE_DIR / "snapshots"
+    snapshots_dir.mkdir(parents=True, exist_ok=True)
+    tmpdir = pathlib.Path(tempfile.mkdtemp(prefix=".tmp-", dir=snapshots_dir))
+    try:
+        if with_files:
+            handler = model.resources["\x00"]
+            for file in handler.rootdir.rglob("*"):
+                relpath = pathlib.PurePosixPath(os.fspath(file))
+                if ".git" in relpath.parts or not file.is_file():
+                    continue
+                target = tmpdir.joinpath("model", *relpath.parts)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(file.read_bytes())
+        (tmpdir / INDEX_NAME).write_text(
+            json.dumps({"fragments": _index_fragments(model)}),
+            encoding="utf8",
+        )
+        tmpdir.rename(snapshots_dir / key)
+    except OSError:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        if not (snapshots_dir / key).is_dir():
+            raise
+        return
+    logger.info("Wrote model snapshot: %s", snapshots_dir / key)
+
+
+def _index_fragments(
+    model: capellambse.MelodyModel,
+) -> dict[str, dict[str, t.Any]]:
+    return {
+        str(fragment.filename): _index_fragment(fragment)
+        for resource_path, fragment in model._loader.trees.items()
+        if resource_path.parts[0] == "\x00"
+    }
+
+
+def _index_fragment(
+    fragment: capellambse.loader.core.ModelFile,
+) -> dict[str, t.Any]:
+    # lxml creates element proxies on demand and ``id()`` is only stable
+    # while a proxy is alive, so hold on to all of them while indexing.
+    elements = list(fragment.root.iter())
+    positions = {id(e): i for i, e in enumerate(elements)}
+    caches = vars(fragment)
+    idcache = caches["_ModelFile__idcache"]
+    qtypecache = caches["_ModelFile__qtypecache"]
+    xtypecache = caches["_ModelFile__xtypecache"]
+    hrefsources = caches["_ModelFile__hrefsources"]
+    return {
+        "elements": len(elements),
+        "ids": [
+            (k, positions[id(v)]) for k, v in idcache.items() if v is not None
+        ],
+        "qtypes": {
+            str(k): [positions[i] for i in v] for k, v in qtypecache.items()
+        },
+        "xtypes": {
+            k: [positions[i] for i in v] for k, v in xtypecache.items()
+        },
+        "hrefs": [(k, positions[id(v)]) for k, v in hrefsources.items()],
+    }
+
+
+def _prune_snapshots() -> None:
+    snapshots_dir = c.CACHE_DIR / "snapshots"
+    snapshots: list[tuple[float, pathlib.Path]] = []
+    now = time.time()
+    try:
+        for path in snapshots_dir.iterdir():
+            mtime = path.stat().st_mtime
+            if not path.name.startswith("."):
+                snapshots.append((mtime, path))
+            elif now - mtime > STALE_TMPDIR_AGE:
+                shutil.rmtree(path, ignore_errors=True)
+    except OSError as err:
+        logger.warning("Cannot prune model snapshots: %s", err)
+        return
+
+    snapshots.sort(reverse=True)
+    for _, path in snapshots[KEEP_SNAPSHOTS:]:
+        logger.info("Deleting unused model snapshot: %s", path)
+        shutil.rmtree(path, ignore_errors=True)
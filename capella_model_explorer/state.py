@@ -3,16 +3,21 @@
 
 from __future__ import annotations
 
+import multiprocessing
+import threading
 import time
 import typing as t
 
 import prometheus_client
+import prometheus_client.core
+
+from capella_model_explorer import core
 
 if t.TYPE_CHECKING:
     import capellambse
     import jinja2
 
-    from capella_model_explorer import reports
+    from capella_model_explorer import cache, reports
 
 jinja_env: jinja2.Environment
 
@@ -20,11 +25,91 @@ jinja_env: jinja2.Environment
 idle_time_gauge = prometheus_client.Gauge(
     "idletime_minutes",
     "Time in minutes since the last user interaction",
+    multiprocess_mode="mostrecent",
+)
+template_cache_hits = prometheus_client.Counter(
+    "template_cache_hits",
+    "Number of report renders that reused an already compiled template",
+)
+template_cache_misses = prometheus_client.Counter(
+    "template_cache_misses",
+    "Number of report renders that had to (re-)compile the template",
+)
+render_lookups_saved = prometheus_client.Counter(
+    "render_lookups_saved",
+    "Number of model lookups during renders that were answered from memory",
+    ["kind"],
 )
-last_interaction = time.time()
+last_interaction = multiprocessing.Value("d", time.time(), lock=False)
+"""Timestamp of the last user interaction, shared with forked workers."""
+renders_in_flight = multiprocessing.Value("i", 0)
+"""Number of interactive renders currently running in all workers."""
+worker_index = 0
+"""Index of this pre-forked worker process, 0 without pre-forking."""
+
+load_phase = "starting"
+load_phase_enum = prometheus_client.Enum(
+    "startup_phase",
+    "Current phase of loading the model and templates",
+    states=[
+        "starting",
+        "model",
+        "templates",
+        "environment",
+        "ready",
+        "failed",
+    ],
+)
+load_started = time.time()
+load_finished: float | None = None
+ready = threading.Event()
+
+
+class StartupCollector(prometheus_client.registry.Collector):
+    def collect(self) -> t.Iterator[prometheus_client.core.Metric]:
+        elapsed = prometheus_client.core.GaugeMetricFamily(
+            "startup_elapsed_seconds",
+            "Time in seconds spent loading the model and templates",
+            value=(load_finished or time.time()) - load_started,
+        )
+        yield elapsed
+
+        phases = prometheus_client.core.GaugeMetricFamily(
+            "startup_phase_seconds",
+            "Time in seconds spent in each startup phase",
+            labels=["phase"],
+        )
+        for phase, seconds in core.startup_times.items():
+            phases.add_metric([phase], seconds)
+        yield phases
+
+
+startup_collector = StartupCollector()
+prometheus_client.REGISTRY.register(startup_collector)
+
+loaded_state_collectors: list[prometheus_client.registry.Collector] = [
+    load_phase_enum,
+    startup_collector,
+]
+"""Collectors that only report on state loaded before forking workers.
+
+When serving with multiple worker processes, these are collected from
+the serving process directly, as they are the same in all workers.
+"""
+
 model: capellambse.MelodyModel
+model_revision: str | None = None
+model_load_source: t.Literal["original", "snapshot"] | None = None
+"""Whether the model was loaded from its original files or a snapshot."""
+render_cache: cache.RenderCache
+diagram_cache: cache.RenderCache
+layout_cache: cache.RenderCache
+static_export = False
+"""Whether reports are rendered for a static export, see :mod:`.export`."""
 
 show_uuids: bool = False
 
 templates: list[reports.Template] = []
+type_index: reports.TypeIndex
+link_index: reports.LinkIndex
 template_categories: list[reports.TemplateCategory] = []
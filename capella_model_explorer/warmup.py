@@ -0,0 +1,121 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Background warm-up of the render cache.
+
+After the model is loaded, the warm-up renders the reports of selected
+templates for all their instances, including the diagrams they embed,
+and stores the results in the render cache. This way, the first visitor
+of a report doesn't have to wait for it to be rendered.
+
+The warm-up runs at low priority: It is limited to a configurable
+fraction of the time, and pauses while interactive renders are running
+in any worker. With multiple workers, only the first one warms up.
+"""
+
+from __future__ import annotations
+
+__all__ = ["start"]
+
+import logging
+import threading
+import time
+
+import prometheus_client
+
+import capella_model_explorer.constants as c
+from capella_model_explorer import app, reports, state
+
+logger = logging.getLogger(__name__)
+
+IDLE_POLL_INTERVAL = 0.1
+"""Time in seconds to wait before checking again for in-flight renders."""
+
+warmup_reports_planned = prometheus_client.Gauge(
+    "warmup_reports_planned",
+    "Number of reports selected for the background warm-up",
+    multiprocess_mode="livesum",
+)
+warmup_reports_done = prometheus_client.Counter(
+    "warmup_reports_done",
+    "Number of reports processed by the background warm-up",
+)
+warmup_failures = prometheus_client.Counter(
+    "warmup_failures",
+    "Number of reports that failed to render during the warm-up",
+)
+warmup_paused_seconds = prometheus_client.Counter(
+    "warmup_paused_seconds",
+    "Time the warm-up spent waiting for interactive renders to finish",
+)
+
+
+def start() -> threading.Thread:
+    """Start the warm-up in a background thread.
+
+    The thread waits for the model to be loaded before doing anything.
+    """
+    thread = threading.Thread(target=run, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def run() -> None:
+    """Warm up the render cache for the selected templates."""
+    state.ready.wait()
+    jobs: list[tuple[reports.Template, str]] = []
+    for template in state.templates:
+        if c.WARMUP_TEMPLATES:
+            if template.id not in c.WARMUP_TEMPLATES:
+                continue
+        elif not template.isStable:
+            continue
+
+        if template.single:
+            jobs.append((template, ""))
+        else:
+            jobs.extend((template, i["uuid"]) for i in template.instances)
+
+    logger.info("Warming up %d reports in the background", len(jobs))
+    warmup_reports_planned.set(len(jobs))
+    started = time.perf_counter()
+    for template, uuid in jobs:
+        _wait_until_idle()
+        busy_since = time.perf_counter()
+        _warm_up_report(template, uuid)
+        warmup_reports_done.inc()
+        busy = time.perf_counter() - busy_since
+        time.sleep(busy * (1 / c.WARMUP_BUDGET - 1))
+    logger.info(
+        "Warm-up of %d reports finished after %.2fs",
+        len(jobs),
+        time.perf_counter() - started,
+    )
+
+
+def _warm_up_report(template: reports.Template, uuid: str) -> None:
+    diagrams: list[tuple[str, str, str]] = []
+    token = reports.collected_diagrams.set(diagrams)
+    try:
+        app.render_report_html(template, uuid)
+        for parent, attr, params in diagrams:
+            _wait_until_idle()
+            app.render_diagram_markup(parent, attr, params)
+    except Exception:
+        warmup_failures.inc()
+        logger.debug(
+            "Cannot warm up template %r for %r",
+            template.id,
+            uuid,
+            exc_info=True,
+        )
+    finally:
+        reports.collected_diagrams.reset(token)
+
+
+def _wait_until_idle() -> None:
+    if state.renders_in_flight.value <= 0:
+        return
+    paused_since = time.perf_counter()
+    while state.renders_in_flight.value > 0:
+        time.sleep(IDLE_POLL_INTERVAL)
+    warmup_paused_seconds.inc(time.perf_counter() - paused_since)
@@ -19,3 +19,120 @@ window.openDiagramViewer = function (svgContainer) {
   }
   lightbox.open({ items: [svgContainer], el: svgContainer });
 };
+
+// Identifies this tab, so that a report that the tab no longer waits for
+// can be cancelled without affecting other tabs of the same browser.
+const tabId = Math.random().toString(36).slice(2) + Date.now().toString(36);
+
+document.addEventListener("htmx:configRequest", (event) => {
+  event.detail.headers["Tab-ID"] = tabId;
+});
+
+// Fill the diagram placeholders of a report from its diagram stream, and
+// request diagrams that the stream didn't deliver individually.
+function streamDiagrams(streamElement) {
+  const report = streamElement.parentElement;
+  const fallback = () => {
+    report.querySelectorAll("[data-diagram-id]").forEach((placeholder) => {
+      htmx.trigger(placeholder, "diagram-fallback");
+    });
+  };
+  const url = streamElement.dataset.diagramStream;
+  if (!url || !report.querySelector("[data-diagram-id]")) {
+    fallback();
+    return;
+  }
+
+  const source = new EventSource(url);
+  source.addEventListener("diagram", (event) => {
+    const { id, html } = JSON.parse(event.data);
+    report
+      .querySelectorAll(`[data-diagram-id="${id}"]`)
+      .forEach((placeholder) => {
+        const template = document.createElement("template");
+        template.innerHTML = html;
+        const diagram = template.content.firstElementChild;
+        placeholder.replaceWith(diagram);
+        htmx.process(diagram);
+      });
+  });
+  const close = () => {
+    source.close();
+    fallback();
+  };
+  source.addEventListener("done", close);
+  source.addEventListener("error", close);
+}
+
+// Show a streamed report while it is still being received, and swap in
+// the complete report once it is done, so that htmx and scripts see it.
+async function streamReport(placeholder) {
+  const target = document.querySelector(placeholder.dataset.reportTarget);
+  const controller = new AbortController();
+  let response;
+  try {
+    response = await fetch(placeholder.dataset.reportStream, {
+      headers: {
+        ...JSON.parse(placeholder.dataset.reportHeaders),
+        "HX-Request": "true",
+        "Tab-ID": tabId,
+      },
+      signal: controller.signal,
+    });
+  } catch {
+    return;
+  }
+  // Superseded by a newer request, or the user already moved on
+  if (response.status === 204 || !placeholder.isConnected) {
+    controller.abort();
+    return;
+  }
+
+  // The parser of an inert document keeps adding to the elements it
+  // created even after they were moved into this document
+  const inert = document.implementation.createHTMLDocument("");
+  inert.write("<div>");
+  const preview = inert.body.firstElementChild;
+  target.replaceChildren(preview);
+
+  let html = "";
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  try {
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) {
+        break;
+      }
+      if (!preview.isConnected) {
+        controller.abort();
+        return;
+      }
+      html += value;
+      inert.write(value);
+    }
+  } catch {
+    return;
+  } finally {
+    inert.close();
+  }
+  if (preview.isConnected) {
+    htmx.swap(target, html, { swapStyle: "innerHTML" });
+  }
+}
+
+htmx.onLoad((element) => {
+  element.querySelectorAll(".diagram-stream").forEach(streamDiagrams);
+  const placeholders = [...element.querySelectorAll("[data-report-stream]")];
+  if (element.matches("[data-report-stream]")) {
+    placeholders.push(element);
+  }
+  placeholders.forEach((placeholder) => {
+    if (placeholder.dataset.reportTrigger === "click") {
+      placeholder.addEventListener("click", () => streamReport(placeholder), {
+        once: true,
+      });
+    } else {
+      streamReport(placeholder);
+    }
+  });
+});
@@ -0,0 +1,336 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import threading
+import time
+import types
+
+from starlette import testclient
+
+from capella_model_explorer import app, cache, executors, reports, state
+
+
+def test_probes_while_loading():
+    client = testclient.TestClient(app.app)
+
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    client.close()
+
+
+def test_ui_routes_show_loading_page_while_loading():
+    client = testclient.TestClient(app.app)
+
+    response = client.get("/")
+    assert response.status_code == 200
+    assert "Loading the model" in response.text
+
+    response = client.get(
+        "/report/some-template", headers={"HX-Request": "true"}
+    )
+    assert response.headers["HX-Refresh"] == "true"
+    client.close()
+
+
+def test_superseded_report_renders_are_cancelled(monkeypatch):
+    def render_report_html(template, uuid, cancellation):
+        del template
+        while uuid == "slow":
+            cancellation.check()
+            time.sleep(0.01)
+        return f"<p>{uuid}</p>"
+
+    monkeypatch.setattr(state, "ready", threading.Event())
+    state.ready.set()
+    monkeypatch.setattr(
+        reports, "template_by_id", lambda _: reports.Template.model_construct()
+    )
+    monkeypatch.setattr(reports.c, "RENDER_TIMEOUT", 0)
+    monkeypatch.setattr(app, "render_report_html", render_report_html)
+    monkeypatch.setattr(app, "report_cache_key", lambda _, uuid: uuid)
+    client = testclient.TestClient(app.app)
+    url = "/rendered-report?template_id=test&model_element_uuid="
+    tab = {"Tab-ID": "tab"}
+    assert client.get(f"{url}fast", headers=tab).status_code == 200
+
+    with concurrent.futures.ThreadPoolExecutor() as pool:
+        slow = pool.submit(client.get, f"{url}slow", headers=tab)
+        time.sleep(0.2)
+        other_tab = client.get(f"{url}fast", headers={"Tab-ID": "other"})
+        assert not slow.done()
+        fast = client.get(f"{url}fast", headers=tab)
+
+    assert other_tab.status_code == 200
+    assert fast.status_code == 200
+    assert slow.result().status_code == 204
+    client.close()
+
+
+def test_renders_are_superseded_from_other_worker_processes():
+    tab_renders = app.TabRenders(4)
+    render_id = tab_renders.start("tab")
+    other_tab = tab_renders.start("other")
+
+    worker = multiprocessing.get_context("fork").Process(
+        target=tab_renders.start, args=("tab",)
+    )
+    worker.start()
+    worker.join()
+
+    assert worker.exitcode == 0
+    assert not tab_renders.is_latest("tab", render_id)
+    assert tab_renders.is_latest("other", other_tab)
+
+
+def test_report_renders_are_cancelled_when_the_client_disconnects(
+    monkeypatch,
+):
+    cancelled = threading.Event()
+    reasons = []
+
+    def render_report_html(template, uuid, cancellation):
+        del template, uuid
+        deadline = time.monotonic() + 5
+        try:
+            while time.monotonic() < deadline:
+                cancellation.check()
+                time.sleep(0.01)
+        except executors.RenderCancelled as err:
+            reasons.append(str(err))
+            cancelled.set()
+            raise
+        return "<p>Not cancelled</p>"
+
+    monkeypatch.setattr(state, "ready", threading.Event())
+    state.ready.set()
+    monkeypatch.setattr(
+        reports, "template_by_id", lambda _: reports.Template.model_construct()
+    )
+    monkeypatch.setattr(reports.c, "RENDER_TIMEOUT", 0)
+    monkeypatch.setattr(app, "render_report_html", render_report_html)
+    monkeypatch.setattr(app, "report_cache_key", lambda _, uuid: uuid)
+    monkeypatch.setattr(app, "DISCONNECT_POLL_INTERVAL", 0.01)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/rendered-report",
+        "raw_path": b"/rendered-report",
+        "root_path": "",
+        "query_string": b"template_id=test&model_element_uuid=slow",
+        "headers": [(b"host", b"testserver")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+    }
+    messages = []
+
+    async def main():
+        requested = False
+        disconnected = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.2, disconnected.set)
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b""}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+
+        await app.app(scope, receive, send)
+
+    asyncio.run(main())
+
+    assert cancelled.is_set()
+    assert reasons == ["client disconnected"]
+    assert messages[0]["status"] == 204
+
+
+def _document_template(monkeypatch, tmp_path) -> reports.Template:
+    (tmp_path / "doc.html.j2").write_text(
+        "{% for i in range(3) %}<p>{{ i * 'x' }}</p>{% endfor %}"
+    )
+    template = reports.Template(
+        id="doc",
+        name="Document",
+        category="Test",
+        description="Test document",
+        path=tmp_path / "doc.html.j2",
+        isDocument=True,
+    )
+    monkeypatch.setattr(state, "ready", threading.Event())
+    state.ready.set()
+    monkeypatch.setattr(reports, "template_by_id", lambda _: template)
+    monkeypatch.setattr(reports.c, "STREAM_DOCUMENTS", True)
+    monkeypatch.setattr(reports.c, "TEMPLATES_DIR", tmp_path)
+    monkeypatch.setattr(app, "STREAM_CHUNK_SIZE", 1)
+    monkeypatch.setattr(state, "model", None, raising=False)
+    monkeypatch.setattr(
+        state, "jinja_env", app._make_jinja_env(), raising=False
+    )
+    monkeypatch.setattr(
+        state,
+        "render_cache",
+        cache.RenderCache("report", max_size=1024),
+        raising=False,
+    )
+    return template
+
+
+def test_document_reports_are_streamed_and_cached(monkeypatch, tmp_path):
+    template = _document_template(monkeypatch, tmp_path)
+    client = testclient.TestClient(app.app)
+
+    response = client.get("/rendered-report?template_id=doc")
+
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-store"
+    assert "ETag" not in response.headers
+    assert "<p></p><p>x</p><p>xx</p>" in response.text
+    assert response.text.startswith('<div class="prose')
+    assert response.text.rstrip().endswith("</script></div>")
+    cache_key = app.report_cache_key(template, "")
+    assert state.render_cache.get(cache_key) == "<p></p><p>x</p><p>xx</p>"
+    assert state.render_cache.get(f"{cache_key}\0diagrams") == "[]"
+    client.close()
+
+
+def test_identical_streamed_reports_are_rendered_once(monkeypatch, tmp_path):
+    _document_template(monkeypatch, tmp_path)
+    starts = []
+
+    def start_report_stream(template, uuid):
+        del template
+        starts.append(uuid)
+        for i in range(3):
+            time.sleep(0.1)
+            yield f"<p>{i}</p>"
+
+    monkeypatch.setattr(app, "_start_report_stream", start_report_stream)
+
+    # Requests only share an event loop inside the client's context
+    with (
+        testclient.TestClient(app.app) as client,
+        concurrent.futures.ThreadPoolExecutor() as pool,
+    ):
+        responses = list(
+            pool.map(client.get, ["/rendered-report?template_id=doc"] * 3)
+        )
+
+    assert starts == [""]
+    for response in responses:
+        assert response.status_code == 200
+        assert "<p>0</p><p>1</p><p>2</p>" in response.text
+        assert response.text.rstrip().endswith("</script></div>")
+
+
+def test_unchanged_diagrams_are_revalidated_without_rendering(monkeypatch):
+    renders = []
+
+    def render_diagram_html(parent, attr, params):
+        renders.append((parent, attr, params))
+        return "<svg/>"
+
+    monkeypatch.setattr(state, "ready", threading.Event())
+    state.ready.set()
+    monkeypatch.setattr(app, "_render_diagram_html", render_diagram_html)
+    client = testclient.TestClient(app.app)
+
+    response = client.get("/diagram/some-uuid/context_diagram")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    response = client.get(
+        "/diagram/some-uuid/context_diagram",
+        headers={"If-None-Match": f"W/{etag}"},
+    )
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    response = client.get(
+        "/diagram/some-uuid/context_diagram?params=%7B%7D",
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 200
+
+    assert len(renders) == 2
+    client.close()
+
+
+def test_diagram_fragments_reference_immutable_svg_images(monkeypatch):
+    monkeypatch.setattr(state, "ready", threading.Event())
+    state.ready.set()
+    monkeypatch.setattr(app, "render_diagram_svg", lambda *_: "<svg/>")
+    monkeypatch.setattr(
+        app, "_find_diagram", lambda *_: types.SimpleNamespace(name="Diag")
+    )
+    client = testclient.TestClient(app.app)
+
+    response = client.get("/diagram/some-uuid/context_diagram")
+    assert "base64" not in response.text
+    url = app.diagram_image_url("some-uuid", "context_diagram", "")
+    assert f'src="{url}"' in response.text
+
+    response = client.get(url)
+    assert response.headers["Content-Type"] == "image/svg+xml"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert response.text == "<svg/>"
+    client.close()
+
+
+def test_report_diagrams_are_streamed_as_they_finish(monkeypatch):
+    def render_diagram_html(parent, attr, params):
+        del attr, params
+        if parent == "slow":
+            time.sleep(0.2)
+        return f"<img alt='{parent}'>"
+
+    monkeypatch.setattr(state, "ready", threading.Event())
+    state.ready.set()
+    monkeypatch.setattr(
+        reports, "template_by_id", lambda _: reports.Template.model_construct()
+    )
+    monkeypatch.setattr(app, "report_cache_key", lambda _, uuid: uuid)
+    monkeypatch.setattr(app, "_render_diagram_html", render_diagram_html)
+    render_cache = cache.RenderCache("report", max_size=1024)
+    diagrams = [("slow", "diagram", ""), ("fast", "diagram", "")]
+    render_cache.put("element\0diagrams", json.dumps(diagrams))
+    monkeypatch.setattr(state, "render_cache", render_cache, raising=False)
+    client = testclient.TestClient(app.app)
+
+    response = client.get(
+        "/report-diagrams?template_id=test&model_element_uuid=element"
+    )
+
+    assert response.headers["Content-Type"].startswith("text/event-stream")
+    events = [i.split("\n") for i in response.text.strip().split("\n\n")]
+    assert [i[0] for i in events] == ["event: diagram"] * 2 + ["event: done"]
+    first, second = (
+        json.loads(i[1].removeprefix("data: ")) for i in events[:2]
+    )
+    assert "fast" in first["html"]
+    assert "slow" in second["html"]
+    assert second["id"] == reports.diagram_element_id("slow", "diagram", "")
+    client.close()
+
+
+def test_memory_caches_are_sized_separately(monkeypatch):
+    monkeypatch.setattr(app.c, "RENDER_CACHE_SIZE", 1)
+    monkeypatch.setattr(app.c, "DIAGRAM_MEMORY_CACHE_SIZE", 2)
+    monkeypatch.setattr(app.c, "LAYOUT_MEMORY_CACHE_SIZE", 3)
+    monkeypatch.setattr(app.c, "RENDER_CACHE_DISK", False)
+    monkeypatch.setattr(app.c, "DIAGRAM_CACHE_SIZE", 0)
+
+    assert app._make_render_cache().max_size == 1024 * 1024
+    assert app._make_diagram_cache().max_size == 2 * 1024 * 1024
+    assert app._make_layout_cache().max_size == 3 * 1024 * 1024
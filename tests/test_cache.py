@@ -0,0 +1,48 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+
+from capella_model_explorer import cache
+
+
+def test_memory_tier_evicts_least_recently_used_entries():
+    render_cache = cache.RenderCache("report", max_size=10)
+    render_cache.put("a", "aaaa")
+    render_cache.put("b", "bbbb")
+    assert render_cache.get("a") == "aaaa"
+
+    render_cache.put("c", "cccc")
+
+    assert render_cache.get("a") == "aaaa"
+    assert render_cache.get("b") is None
+    assert render_cache.get("c") == "cccc"
+
+
+def test_disk_tier_survives_new_cache_instances(tmp_path):
+    cache.RenderCache("report", max_size=0, directory=tmp_path).put(
+        "key", "report"
+    )
+
+    render_cache = cache.RenderCache(
+        "report", max_size=100, directory=tmp_path
+    )
+
+    assert render_cache.get("key") == "report"
+    assert render_cache.get("other") is None
+
+
+def test_disk_tier_evicts_least_recently_used_files(tmp_path):
+    render_cache = cache.RenderCache(
+        "diagram", max_size=0, directory=tmp_path, max_disk_size=10
+    )
+    render_cache.put("a", "aaaa")
+    render_cache.put("b", "bbbb")
+    for i, key in enumerate(("b", "a")):
+        os.utime(render_cache._path(key), (1000 + i, 1000 + i))
+
+    render_cache.put("c", "cccc")
+
+    assert render_cache.get("a") == "aaaa"
+    assert render_cache.get("b") is None
+    assert render_cache.get("c") == "cccc"
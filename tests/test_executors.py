@@ -0,0 +1,151 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import multiprocessing
+import os
+import pathlib
+import threading
+import time
+
+from capella_model_explorer import executors
+
+
+def test_renders_beyond_the_limit_wait_in_the_queue():
+    executor = executors.RenderExecutor("test", max_workers=1)
+    depth = executors.render_queue_depth.labels("test")
+    release = threading.Event()
+
+    async def main():
+        first = asyncio.create_task(executor.run(release.wait))
+        second = asyncio.create_task(executor.run(lambda: "done"))
+        await asyncio.sleep(0.1)
+        assert depth._value.get() == 1
+
+        release.set()
+        return await first, await second
+
+    assert asyncio.run(main()) == (True, "done")
+    assert depth._value.get() == 0
+
+
+def test_running_renders_are_counted_in_a_shared_counter():
+    in_flight = multiprocessing.Value("i", 0)
+    executor = executors.RenderExecutor(
+        "test-counted", max_workers=2, in_flight=in_flight
+    )
+    release = threading.Event()
+
+    async def main():
+        task = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.1)
+        assert in_flight.value == 1
+
+        release.set()
+        await task
+
+    asyncio.run(main())
+    assert in_flight.value == 0
+
+
+def _crash_once(marker: pathlib.Path) -> int:
+    if not marker.exists():
+        marker.touch()
+        os._exit(1)
+    return os.getpid()
+
+
+def _wait_for_cancellation(timeout: float) -> str:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if executors.cancellation_requested():
+            return "cancelled"
+        time.sleep(0.01)
+    return "finished"
+
+
+def test_render_farm_retries_after_a_process_crashed(tmp_path, monkeypatch):
+    # Idle threads of other tests' executors don't hold any locks
+    monkeypatch.setattr(executors.threading, "active_count", lambda: 1)
+    farm = executors.RenderFarm(1)
+    farm.start()
+
+    pid = farm.call(_crash_once, tmp_path / "crashed")
+
+    assert pid != os.getpid()
+    assert (tmp_path / "crashed").exists()
+
+
+def test_stopped_render_processes_are_removed_from_metrics(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(executors.threading, "active_count", lambda: 1)
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    farm = executors.RenderFarm(1)
+    farm.start()
+    crashed = farm.call(os.getpid)
+    (tmp_path / f"gauge_livesum_{crashed}.db").touch()
+
+    replacement = farm.call(_crash_once, tmp_path / "crashed")
+    (tmp_path / f"gauge_livesum_{replacement}.db").touch()
+    assert not (tmp_path / f"gauge_livesum_{crashed}.db").exists()
+    farm.shutdown()
+
+    assert not (tmp_path / f"gauge_livesum_{replacement}.db").exists()
+
+
+def test_render_farm_propagates_cancellation(monkeypatch):
+    monkeypatch.setattr(executors.threading, "active_count", lambda: 1)
+    monkeypatch.setattr(executors, "CANCEL_POLL_INTERVAL", 0.01)
+    farm = executors.RenderFarm(1)
+    farm.start()
+    cancel_at = time.monotonic() + 0.2
+
+    def check():
+        if time.monotonic() > cancel_at:
+            raise LookupError("cancelled")
+
+    assert farm.call_cancellable(None, _wait_for_cancellation, 0.1) == (
+        "finished"
+    )
+    assert farm.call_cancellable(check, _wait_for_cancellation, 10) == (
+        "cancelled"
+    )
+    assert not executors.cancellation_requested()
+
+
+def test_render_farm_renders_in_threads_until_started():
+    farm = executors.RenderFarm(1)
+
+    assert farm.call(os.getpid) == os.getpid()
+
+
+def test_identical_concurrent_renders_run_once():
+    flights = executors.SingleFlight("test", retry_on=(LookupError,))
+    calls = []
+
+    async def render(result):
+        calls.append(result)
+        await asyncio.sleep(0.05)
+        if calls.count("cancelled") == 1 and result == "cancelled":
+            raise LookupError("cancelled by the first client")
+        return result
+
+    async def main():
+        coalesced = await asyncio.gather(
+            *(flights.run("key", render, "result") for _ in range(5))
+        )
+        retried = await asyncio.gather(
+            *(flights.run("other", render, "cancelled") for _ in range(3)),
+            return_exceptions=True,
+        )
+        return coalesced, retried
+
+    coalesced, retried = asyncio.run(main())
+
+    assert coalesced == ["result"] * 5
+    assert isinstance(retried[0], LookupError)
+    assert retried[1:] == ["cancelled", "cancelled"]
+    assert len(calls) == 3
+    count = executors.render_requests_coalesced.labels("test")._value.get()
+    assert count == 4 + 3
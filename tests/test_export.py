@@ -0,0 +1,41 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging
+
+from capella_model_explorer import export, reports, state
+
+
+def test_links_are_relative_in_static_exports(monkeypatch):
+    monkeypatch.setattr(state, "static_export", True)
+
+    assert reports.report_href("template", "uuid") == "../template/uuid.html"
+    assert reports.report_href("single", "") == "../single/index.html"
+
+
+def test_unchanged_files_are_not_rewritten(tmp_path):
+    path = tmp_path / "report" / "index.html"
+
+    assert export._write_if_changed(path, "<p>Report</p>") == "written"
+    mtime = path.stat().st_mtime_ns
+    assert export._write_if_changed(path, "<p>Report</p>") == "unchanged"
+    assert path.stat().st_mtime_ns == mtime
+    assert export._write_if_changed(path, "<p>Changed</p>") == "written"
+    assert path.read_text() == "<p>Changed</p>"
+
+
+def test_exports_of_models_without_revision_are_not_incremental(
+    monkeypatch, tmp_path, caplog
+):
+    manifest = {"reports": {"report/index.html": {}}, "diagrams": {}}
+    path = tmp_path / export.MANIFEST_NAME
+    path.write_text(json.dumps(manifest), encoding="utf8")
+
+    monkeypatch.setattr(state, "model_revision", "content:abc")
+    assert export._read_manifest(path) == manifest
+
+    monkeypatch.setattr(state, "model_revision", None)
+    with caplog.at_level(logging.WARNING):
+        assert export._read_manifest(path) == {"reports": {}, "diagrams": {}}
+    assert "revision is unknown" in caplog.text
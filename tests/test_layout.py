@@ -0,0 +1,32 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from capellambse_context_diagrams import _elkjs
+
+from capella_model_explorer import cache, layout, state
+
+
+def test_layouts_of_identical_graphs_are_reused(monkeypatch, tmp_path):
+    calls = []
+
+    def call_elkjs(_, elk_model):
+        calls.append(elk_model)
+        return _elkjs.ELKOutputData(id=elk_model.id, type="graph")
+
+    monkeypatch.setattr(_elkjs.ELKManager, "call_elkjs", call_elkjs)
+    monkeypatch.setattr(
+        state,
+        "layout_cache",
+        cache.RenderCache("layout", max_size=0, directory=tmp_path),
+        raising=False,
+    )
+    manager = layout.CachingELKManager()
+
+    first = manager.call_elkjs(_elkjs.ELKInputData(id="a"))
+    second = manager.call_elkjs(_elkjs.ELKInputData(id="a"))
+    other = manager.call_elkjs(_elkjs.ELKInputData(id="b"))
+
+    assert len(calls) == 2
+    assert first == second
+    assert second is not first
+    assert other.id == "b"
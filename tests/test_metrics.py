@@ -3,6 +3,7 @@
 
 import time
 
+import prometheus_client
 from starlette import testclient
 
 from capella_model_explorer import app
@@ -28,3 +29,18 @@ def test_idle_time_metric():
     idle_time_minutes_2 = _idle_time_minutes(response.text)
     assert idle_time_minutes_2 > idle_time_minutes_1
     client.close()
+
+
+def test_slow_renders_are_measured_and_logged(monkeypatch, caplog):
+    registry = prometheus_client.REGISTRY
+    labels = {"template_id": "slow-template"}
+    monkeypatch.setattr(app.c, "SLOW_RENDER_THRESHOLD", 1.0)
+
+    app._observe_report_render("slow-template", "", 0.5, 100)
+    app._observe_report_render("slow-template", "", 1.5, 100)
+
+    count = registry.get_sample_value("report_render_seconds_count", labels)
+    assert count == 2
+    slow_logs = [i for i in caplog.records if i.msg.startswith("Slow render")]
+    assert len(slow_logs) == 1
+    assert slow_logs[0].seconds == 1.5
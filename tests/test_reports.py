@@ -0,0 +1,332 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+import concurrent.futures
+import os
+import subprocess
+import sys
+import threading
+import time
+import types
+import typing as t
+
+import jinja2
+import pytest
+
+from capella_model_explorer import core, reports
+
+
+def _template(**kw) -> reports.Template:
+    return reports.Template(
+        name="Test",
+        category="Test",
+        description="Test template",
+        **{"id": "test", "path": "test.html.j2"} | kw,
+    )
+
+
+def test_instances_are_computed_once_on_first_access(monkeypatch):
+    calls = 0
+
+    def compute(_):
+        nonlocal calls
+        calls += 1
+        time.sleep(0.1)
+        return [{"uuid": "1", "name": "One"}]
+
+    monkeypatch.setattr(reports.Template, "_compute_instances", compute)
+    template = _template()
+    assert template.known_instance_count is None
+
+    threads = [
+        threading.Thread(target=lambda: template.instances) for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == 1
+    assert template.known_instance_count == 1
+    assert template.instances == [{"uuid": "1", "name": "One"}]
+
+
+def test_single_templates_have_one_instance():
+    template = _template(single=True)
+    assert template.known_instance_count == 1
+    assert template.instances == []
+
+
+def test_parallel_scope_resolution_records_errors(monkeypatch):
+    def find_objects(self, **_):
+        if self.id == "broken":
+            raise ValueError("Boom")
+        return []
+
+    monkeypatch.setattr(reports.Template, "_find_objects", find_objects)
+    monkeypatch.setattr(reports.c, "TEMPLATE_WORKERS", 2)
+    scope = reports.TemplateScope(type="Anything")
+    templates = [_template(scope=scope), _template(scope=scope)]
+    templates[1].id = "broken"
+    monkeypatch.setattr(reports.state, "templates", templates)
+
+    reports._compute_all_instances()
+
+    assert templates[0].instances == []
+    assert templates[0].error is None
+    assert templates[1].error == "Template scope error: Boom"
+    assert "ValueError: Boom" in templates[1].traceback
+
+
+class _InlinePool(concurrent.futures.Executor):
+    pools: t.ClassVar[list[_InlinePool]] = []
+
+    def __init__(self, workers, *, mp_context, initializer=None):
+        self.workers = workers
+        self.start_method = mp_context.get_start_method()
+        self.initializer = initializer
+        self.mapped: list[str] = []
+        self.pools.append(self)
+
+    def map(self, fn, *iterables, **_):
+        self.mapped.extend(iterables[0])
+        return map(fn, *iterables)
+
+
+def _scoped_templates(monkeypatch) -> list[reports.Template]:
+    monkeypatch.setattr(
+        reports.concurrent.futures, "ProcessPoolExecutor", _InlinePool
+    )
+    monkeypatch.setattr(_InlinePool, "pools", [])
+    monkeypatch.setattr(reports.Template, "_find_objects", lambda _, **__: [])
+    monkeypatch.setattr(reports.c, "TEMPLATE_WORKERS", 2)
+    scope = reports.TemplateScope(type="Anything")
+    templates = [_template(scope=scope), _template(scope=scope)]
+    templates[1].id = "other"
+    monkeypatch.setattr(reports.state, "templates", templates)
+    return templates
+
+
+def test_scopes_are_resolved_by_fresh_workers_while_loading_in_a_thread(
+    monkeypatch,
+):
+    templates = _scoped_templates(monkeypatch)
+    monkeypatch.setattr(reports.c, "MODEL_SNAPSHOT", True)
+    monkeypatch.setattr(reports.state, "model_revision", "content:abc")
+    monkeypatch.setattr(reports.c, "LAZY_INSTANCES", False)
+    monkeypatch.setattr(reports.state, "model", None, raising=False)
+    monkeypatch.setattr(reports, "TypeIndex", lambda _: None)
+    monkeypatch.setattr(reports, "_read_templates", lambda: None)
+
+    thread = threading.Thread(target=reports.load_templates)
+    thread.start()
+    thread.join()
+
+    (pool,) = _InlinePool.pools
+    assert pool.start_method in {"forkserver", "spawn"}
+    assert pool.initializer is reports._init_template_worker
+    assert pool.mapped == ["test", "other"]
+    assert [i.instances for i in templates] == [[], []]
+
+
+def test_scopes_are_resolved_serially_without_snapshot_in_threads(
+    monkeypatch,
+):
+    templates = _scoped_templates(monkeypatch)
+    monkeypatch.setattr(reports.state, "model_revision", None)
+    thread = threading.Thread(target=reports._compute_all_instances)
+
+    thread.start()
+    thread.join()
+
+    assert _InlinePool.pools == []
+    assert [i.instances for i in templates] == [[], []]
+    assert [i.error for i in templates] == [None, None]
+
+
+def test_compiled_templates_are_reused_until_changed(monkeypatch, tmp_path):
+    (tmp_path / "macros.html.j2").write_text(
+        "{% macro greet() %}Hello{% endmacro %}"
+    )
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "report.html.j2").write_text(
+        "{% from 'macros.html.j2' import greet %}{{ greet() }}"
+    )
+    monkeypatch.setattr(reports.c, "TEMPLATES_DIR", tmp_path)
+    monkeypatch.setattr(
+        reports.state,
+        "jinja_env",
+        jinja2.Environment(loader=jinja2.FileSystemLoader(tmp_path)),
+        raising=False,
+    )
+    template = _template(path=tmp_path / "sub" / ".." / "sub/report.html.j2")
+    hits = reports.state.template_cache_hits._value.get()
+
+    first = template.load_jinja_template()
+    assert template.load_jinja_template() is first
+    assert reports.state.template_cache_hits._value.get() == hits + 1
+    assert first.render() == "Hello"
+
+    macros = tmp_path / "macros.html.j2"
+    macros.write_text("{% macro greet() %}Bye{% endmacro %}")
+    os.utime(macros, (time.time() + 5, time.time() + 5))
+    assert template.load_jinja_template().render() == "Bye"
+
+
+def test_template_hash_covers_referenced_templates(monkeypatch, tmp_path):
+    (tmp_path / "base.html.j2").write_text("{% block body %}{% endblock %}")
+    (tmp_path / "macros.html.j2").write_text(
+        "{% macro greet() %}Hello{% endmacro %}"
+    )
+    (tmp_path / "unrelated.html.j2").write_text("Unrelated")
+    (tmp_path / "sub").mkdir()
+    report = tmp_path / "sub" / "report.html.j2"
+    report.write_text(
+        "{% extends 'base.html.j2' %}{% block body %}"
+        "{% from 'macros.html.j2' import greet %}{{ greet() }}"
+        "{% endblock %}"
+    )
+    monkeypatch.setattr(reports.c, "TEMPLATES_DIR", tmp_path)
+
+    def touch(name, text):
+        path = tmp_path / name
+        path.write_text(text)
+        os.utime(path, (time.time() + 5, time.time() + 5))
+
+    first_hash = reports.compute_template_hash(report)
+    touch("unrelated.html.j2", "Changed")
+    assert reports.compute_template_hash(report) == first_hash
+    touch("macros.html.j2", "{% macro greet() %}Bye{% endmacro %}")
+    second_hash = reports.compute_template_hash(report)
+    assert second_hash != first_hash
+    touch("base.html.j2", "<p>{% block body %}{% endblock %}</p>")
+    assert reports.compute_template_hash(report) != second_hash
+
+    report.write_text("{% include name %}")
+    os.utime(report, (time.time() + 10, time.time() + 10))
+    dynamic_hash = reports.compute_template_hash(report)
+    touch("unrelated.html.j2", "Changed again")
+    assert reports.compute_template_hash(report) != dynamic_hash
+
+
+def test_file_hashes_are_recomputed_only_after_changes(tmp_path):
+    path = tmp_path / "test.html.j2"
+    path.write_text("first")
+    first_hash = core.compute_file_hash(str(path))
+    mtime = path.stat().st_mtime_ns
+
+    path.write_text("other")
+    os.utime(path, ns=(mtime, mtime))
+    assert core.compute_file_hash(str(path)) == first_hash
+
+    os.utime(path, ns=(mtime + 1_000_000, mtime + 1_000_000))
+    assert core.compute_file_hash(str(path)) != first_hash
+
+
+def test_links_point_to_the_first_applicable_template(monkeypatch):
+    monkeypatch.setattr(reports, "report_href", lambda tid, _: tid)
+    templates = [
+        _template(id="single", single=True),
+        _template(
+            id="actor",
+            scope={"type": "LogicalComponent", "filters": {"is_actor": 1}},
+        ),
+        _template(id="component", scope={"type": "LogicalComponent"}),
+        _template(id="generic", path="__generic__.html.j2"),
+    ]
+    index = reports.LinkIndex(templates)
+    actor = types.SimpleNamespace(
+        uuid="1",
+        xtype="org.polarsys.capella.core.data.la:LogicalComponent",
+        is_actor=1,
+    )
+    function = types.SimpleNamespace(
+        uuid="2", xtype="org.polarsys.capella.core.data.la:LogicalFunction"
+    )
+
+    assert index.href(actor) == "actor"
+    assert index.href(function) == "generic"
+    actor.is_actor = 0
+    assert index.href(actor) == "actor"
+    assert reports.LinkIndex(templates).href(actor) == "component"
+
+
+def test_model_lookups_are_memoized_within_a_render(monkeypatch):
+    lookups = []
+
+    namespace = reports.m.Namespace("https://example.com/test", "test")
+
+    class Element(reports.m.ModelElement, ns=namespace):
+        uuid = "element"
+
+        @property
+        def relations(self):
+            lookups.append("relations")
+            return "related"
+
+    elem = object.__new__(Element)
+    model = types.SimpleNamespace(
+        by_uuid=lambda uuid: lookups.append(uuid) or uuid
+    )
+    monkeypatch.setattr(reports.state, "model", model, raising=False)
+    env = reports.RenderEnvironment()
+    template = env.from_string("{{ obj.relations }} {{ obj.relations }}")
+
+    token = reports.render_memo.set(reports.RenderMemo())
+    try:
+        assert template.render(obj=elem) == "related related"
+        reports.lookup_element("other")
+        reports.lookup_element("other")
+    finally:
+        reports.render_memo.reset(token)
+    assert lookups == ["relations", "other"]
+
+    assert template.render(obj=elem) == "related related"
+    assert lookups.count("relations") == 3
+
+
+def test_type_index_preserves_the_order_of_model_search(monkeypatch):
+    class Base:
+        pass
+
+    class Sub(Base):
+        pass
+
+    def tree(**groups):
+        return types.SimpleNamespace(
+            fragment_type=reports.capellambse.loader.FragmentType.SEMANTIC,
+            iter_qtypes=lambda: iter(groups),
+            iter_qtype=lambda qtype: iter(groups[qtype]),
+        )
+
+    layers = {
+        name: types.SimpleNamespace(_element=name)
+        for name in reports.TypeIndex.LAYERS
+    }
+    model = types.SimpleNamespace(
+        **layers,
+        resolve_class={"Base": Base, "Sub": Sub}.__getitem__,
+        _loader=types.SimpleNamespace(
+            iterdescendants=lambda root: ["s2", "b2"] if root == "la" else [],
+            trees={
+                "a": tree(Sub=["s1", "s2"], Base=["b1"]),
+                "b": tree(Base=["b2"], Sub=["s3"]),
+            },
+        ),
+    )
+    monkeypatch.setattr(reports.m, "ElementList", lambda _, e, __: e)
+    index = reports.TypeIndex(model)
+
+    assert index.search("Base") == ["s1", "s2", "b1", "b2", "s3"]
+    assert index.search("Base", below="la") == ["s2", "b2"]
+    assert index.search("Sub") == ["s1", "s2", "s3"]
+
+
+@pytest.mark.parametrize("module", ["reports", "warmup", "export"])
+def test_modules_can_be_imported_first(module):
+    subprocess.run(
+        [sys.executable, "-c", f"import capella_model_explorer.{module}"],
+        check=True,
+    )
@@ -0,0 +1,135 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import pathlib
+
+import capellambse.filehandler.local
+import capellambse.loader.core
+import pytest
+
+import capella_model_explorer.constants as c
+from capella_model_explorer import snapshot
+
+FRAGMENT = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<org.polarsys.capella.core.data.capellamodeller:Project
+    xmlns:xmi="http://www.omg.org/XMI"
+    xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+    xmlns:org.polarsys.capella.core.data.capellamodeller="http://www.polarsys.org/capella/core/modeller/5.0.0"
+    id="project" name="Test">
+  <ownedModelRoots
+      xsi:type="org.polarsys.capella.core.data.capellamodeller:SystemEngineering"
+      id="engineering" name="Engineering"/>
+  <ownedModelRoots
+      xsi:type="org.polarsys.capella.core.data.capellamodeller:SystemEngineering"
+      id="other" name="Other"/>
+</org.polarsys.capella.core.data.capellamodeller:Project>
+"""
+
+
+def _caches(fragment):
+    caches = vars(fragment)
+    return {
+        "ids": {
+            k: v.get("id")
+            for k, v in caches["_ModelFile__idcache"].items()
+            if v is not None
+        },
+        "qtypes": {
+            str(k): sorted(e.get("id") for e in v.values())
+            for k, v in caches["_ModelFile__qtypecache"].items()
+        },
+        "xtypes": {
+            k: sorted(e.get("id") for e in v.values())
+            for k, v in caches["_ModelFile__xtypecache"].items()
+        },
+    }
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    (model_dir / "test.capella").write_text(FRAGMENT, encoding="utf8")
+    return model_dir
+
+
+def test_index_restores_the_element_caches_of_a_fragment(model_dir):
+    handler = capellambse.filehandler.local.LocalFileHandler(model_dir)
+    filename = pathlib.PurePosixPath("test.capella")
+    original = capellambse.loader.core.ModelFile(
+        filename, handler, ignore_uuid_dups=False
+    )
+    index = snapshot._index_fragment(original)
+    snapshot._IndexedModelFile.root_dir = model_dir.resolve()
+    snapshot._IndexedModelFile.pending = {str(filename): index}
+
+    try:
+        restored = snapshot._IndexedModelFile(
+            filename, handler, ignore_uuid_dups=False
+        )
+    finally:
+        snapshot._IndexedModelFile.root_dir = None
+
+    assert snapshot._IndexedModelFile.pending == {}
+    assert _caches(restored) == _caches(original)
+    assert _caches(restored)["ids"]["other"] == "other"
+
+
+def test_outdated_index_is_rebuilt(model_dir):
+    handler = capellambse.filehandler.local.LocalFileHandler(model_dir)
+    filename = pathlib.PurePosixPath("test.capella")
+    original = capellambse.loader.core.ModelFile(
+        filename, handler, ignore_uuid_dups=False
+    )
+    index = snapshot._index_fragment(original) | {"elements": 1, "ids": []}
+    snapshot._IndexedModelFile.root_dir = model_dir.resolve()
+    snapshot._IndexedModelFile.pending = {str(filename): index}
+
+    try:
+        restored = snapshot._IndexedModelFile(
+            filename, handler, ignore_uuid_dups=False
+        )
+    finally:
+        snapshot._IndexedModelFile.root_dir = None
+        snapshot._IndexedModelFile.pending = {}
+
+    assert _caches(restored) == _caches(original)
+
+
+def test_content_hash_changes_with_model_files_only(model_dir):
+    (model_dir / ".git").mkdir()
+    (model_dir / ".git" / "old.capella").write_text("", encoding="utf8")
+    (model_dir / "notes.txt").write_text("", encoding="utf8")
+    revision = snapshot._hash_model_files(model_dir)
+
+    (model_dir / ".git" / "old.capella").write_text("x", encoding="utf8")
+    (model_dir / "notes.txt").write_text("x", encoding="utf8")
+    assert snapshot._hash_model_files(model_dir) == revision
+
+    (model_dir / "test.capella").write_text(
+        FRAGMENT.replace("Other", "Changed"), encoding="utf8"
+    )
+    assert snapshot._hash_model_files(model_dir) != revision
+    assert revision is not None
+    assert revision.startswith("content:")
+
+
+def test_prune_keeps_the_most_recently_used_snapshots(tmp_path, monkeypatch):
+    monkeypatch.setattr(c, "CACHE_DIR", tmp_path)
+    snapshots_dir = tmp_path / "snapshots"
+    names = [f"snapshot-{i}" for i in range(snapshot.KEEP_SNAPSHOTS + 2)]
+    for i, name in enumerate(names):
+        (snapshots_dir / name).mkdir(parents=True)
+        os.utime(snapshots_dir / name, (1000 + i, 1000 + i))
+    (snapshots_dir / ".tmp-stale").mkdir()
+    os.utime(snapshots_dir / ".tmp-stale", (0, 0))
+    (snapshots_dir / ".tmp-running").mkdir()
+
+    snapshot._prune_snapshots()
+
+    assert sorted(i.name for i in snapshots_dir.iterdir()) == [
+        ".tmp-running",
+        *names[-snapshot.KEEP_SNAPSHOTS :],
+    ]
@@ -0,0 +1,74 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import threading
+
+import pytest
+
+import capella_model_explorer.constants as c
+from capella_model_explorer import reports, state, warmup
+
+
+def _template(template_id: str, **kw) -> reports.Template:
+    return reports.Template(
+        id=template_id,
+        name=template_id,
+        category="Test",
+        description="Test template",
+        path="test.html.j2",
+        **kw,
+    )
+
+
+def test_warmup_renders_stable_templates_and_their_diagrams(monkeypatch):
+    rendered: list[tuple[str, str]] = []
+
+    def render_report_html(template, uuid):
+        rendered.append((template.id, uuid))
+        reports.collected_diagrams.get().append((uuid, "diagram", ""))
+        return ""
+
+    def render_diagram_markup(parent, attr, _):
+        rendered.append((parent, attr))
+        return ""
+
+    monkeypatch.setattr(warmup.app, "render_report_html", render_report_html)
+    monkeypatch.setattr(
+        warmup.app, "render_diagram_markup", render_diagram_markup
+    )
+    monkeypatch.setattr(warmup.c, "WARMUP_BUDGET", 1.0)
+    monkeypatch.setattr(
+        state,
+        "templates",
+        [
+            _template("stable", isStable=True, single=True),
+            _template("unstable", single=True),
+        ],
+    )
+    monkeypatch.setattr(state, "ready", threading.Event())
+    state.ready.set()
+
+    warmup.run()
+
+    assert rendered == [("stable", ""), ("", "diagram")]
+
+
+def test_warmup_waits_for_interactive_renders(monkeypatch):
+    monkeypatch.setattr(warmup, "IDLE_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(state.renders_in_flight, "value", 1)
+    waiter = threading.Thread(target=warmup._wait_until_idle)
+    waiter.start()
+
+    waiter.join(0.1)
+    assert waiter.is_alive()
+    state.renders_in_flight.value = 0
+    waiter.join(1)
+    assert not waiter.is_alive()
+
+
+@pytest.mark.parametrize("value", ["0", "-0.5", "1.5", "all"])
+def test_invalid_warmup_budgets_are_rejected(monkeypatch, value):
+    monkeypatch.setenv("CME_WARMUP_BUDGET", value)
+
+    with pytest.raises(ValueError, match="CME_WARMUP_BUDGET"):
+        c.CONFIG("WARMUP_BUDGET", cast=c.fraction)